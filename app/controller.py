@@ -5,107 +5,187 @@ from http import HTTPStatus
 import utils.config as env_vars
 
 import app.models as models
+from app.request_decoder import format_validation_errors
+from pydantic import ValidationError
+import asyncio
 import logging
-import traceback
+import secrets
 import jwt
-import redis
 
-# Initialize Redis client
-redis_client = redis.Redis(
-    host = env_vars.REDIS_HOST,
-    port = env_vars.REDIS_PORT,
-    db = 0,
-    decode_responses=True
-)
+from utils.storage import get_user_store, get_revocation_store
+from utils.token_cache import token_cache
+from utils.user_generation import generation_table
+from utils.password_hasher import password_hasher, HasherOverloaded
+from utils.signing_keys import access_keys, refresh_keys, decode_token
+from utils.revocation_replica import revocation_replica, get_revocation_id
+from utils.circuit_breaker import store_breaker, StoreUnavailable
+
+# Sentinel returned by _get_token_validity for revoked tokens
+TOKEN_REVOKED = -2
+
+
+async def _no_lookups() -> list:
+    return []
 
 class Controller:
-    def __init__(self, input_request: models.DTORequest):
+    def __init__(self, input_request):
+        # input_request is a DTORequest decoded by the view, or a HeaderTokenRequest for the header authenticated routes
         self._input_request = input_request
-        self._trace_id = input_request.get('traceId')
-        self._data = input_request.get('data')
+        self._trace_id = getattr(input_request, 'traceId', None)
+        self._data = getattr(input_request, 'data', None)
         self._controller_response = models.DTOResponse()
+        self._users = get_user_store()
+        self._revocations = get_revocation_store()
 
     
-    def _check_token_validity_time(self, token):
+    @staticmethod
+    def _encode_token(username, expires, generation, key_ring):
+        # A short random jti identifies the token in the revocation store, gen ties it to the user's generation
+        return key_ring.encode(
+            {"sub": username, "exp": expires, "jti": secrets.token_urlsafe(env_vars.TOKEN_JTI_BYTES), "gen": generation}
+        )
+
+    def _decode_token(self, token, key_rings=(access_keys, refresh_keys)):
+        # Returns the verified claims, 0 when the token has expired and -1 when it is invalid
         try:
-            decoded_token = jwt.decode(token, env_vars.SECRET_KEY, algorithms=[env_vars.ALGORITHM])
-            exp = decoded_token.get("exp")
-            remaining_time = exp - datetime.now(timezone.utc).timestamp()
-            return remaining_time
+            decoded_token = decode_token(token, *key_rings)
+            return decoded_token
         except jwt.ExpiredSignatureError:
             return 0
         except Exception as e:
             error = f"Error while checking token validity : {e=}"
-            logger.error(f"Controller:validate_token():: {error} traceId={self._trace_id} request={self._input_request} call_stack={traceback.format_exc()}")
+            logger.error("Controller:validate_token():: %s request=%s", error, self._input_request, exc_info=True)
             return -1
-            
-        
 
-    def create_user(self) -> models.DTOResponse:
+    async def _verify_credentials(self, username, password, stored_password):
+        # Unknown users still pay for a hash, so response times do not reveal which usernames exist
+        matches, needs_rehash = await password_hasher.verify(password, stored_password)
+        if matches and needs_rehash:
+            # Plaintext entries and hashes made with old parameters are upgraded on a successful login
+            try:
+                await self._users.set_password(username, await password_hasher.hash(password))
+            except HasherOverloaded:
+                pass
+        return matches
+
+    @staticmethod
+    def _degraded_mode_allowed():
+        # fail_open only holds for a bounded window, a long outage falls back to fail_closed
+        return env_vars.DEGRADED_MODE == "fail_open" and store_breaker.unhealthy_for() <= env_vars.DEGRADED_MAX_SECONDS
+
+    async def _is_current_generation(self, decoded_token):
+        # Tokens minted before generations were introduced carry no gen claim and count as generation 0
+        username = decoded_token.get("sub")
         try:
+            current_generation = await generation_table.get(self._users, username)
+        except StoreUnavailable:
+            if not self._degraded_mode_allowed():
+                raise
+            current_generation = generation_table.peek_stale(username)
+        return decoded_token.get("gen", 0) >= current_generation
+
+    async def _get_token_validity(self, token):
+        return (await self._get_token_state(token))[0]
+
+    async def check_access_token(self, token):
+        """Returns (validity, claims) like _get_token_validity, accepting access tokens only"""
+        return await self._get_token_state(token, (access_keys,))
 
-            # request format validation on python
-            user_auth_request : models.UserAuthRequest = None
+    async def _get_token_state(self, token, key_rings=(access_keys, refresh_keys)):
+        # Returns (validity, claims), claims are None when the token could not be verified.
+        # Served from the verified token cache when possible, skipping the store and the signature check
+        cached = token_cache.get(token)
+        if cached is not None:
+            decoded_token, revocation_id, revoked = cached
+            # The cache is shared by every route, a token verified by another ring must not pass here
+            token_type = decoded_token.get("typ")
+            if token_type is not None and token_type not in {key_ring.token_type for key_ring in key_rings}:
+                return -1, None
+            if revoked or revocation_replica.is_revoked(revocation_id):
+                return TOKEN_REVOKED, decoded_token
+            if not await self._is_current_generation(decoded_token):
+                return TOKEN_REVOKED, decoded_token
+            return max(decoded_token.get("exp") - datetime.now(timezone.utc).timestamp(), 0), decoded_token
+
+        decoded_token = self._decode_token(token, key_rings)
+        if not isinstance(decoded_token, dict):
+            return decoded_token, None
+
+        exp = decoded_token.get("exp")
+        revocation_id = get_revocation_id(token, decoded_token)
+
+        # The store is only asked while the local revocation replica is catching up, has none (memory backend),
+        # or for tokens without a jti, whose revocations may predate the replica
+        revoked = revocation_replica.is_revoked(revocation_id)
+        if revoked is None:
             try:
-                user_auth_request : models.UserAuthRequest = models.UserAuthRequest(**self._data)
-            except Exception as e:
-                error = f"Invalid data field received. Error while creating the user {e}"
-                logger.error(
-                    f"Controller:create_user():: {error=} traceId={self._trace_id} request={self._input_request} call_stack={traceback.format_exc()}"
-                )
-                self._controller_response.statusCode = HTTPStatus.BAD_REQUEST
-                self._controller_response.message = error
-                return self._controller_response
+                revoked = await self._revocations.is_revoked(revocation_id, token)
+            except StoreUnavailable:
+                if not self._degraded_mode_allowed():
+                    raise
+                # Degraded answers are never cached, the store decides again once it is back
+                logger.warning("Controller:_get_token_state():: Storage unavailable, validating in degraded mode")
+                if revocation_replica.is_revoked_locally(revocation_id) or not await self._is_current_generation(decoded_token):
+                    return TOKEN_REVOKED, decoded_token
+                return exp - datetime.now(timezone.utc).timestamp(), decoded_token
+
+        token_cache.put(token, decoded_token, revocation_id, revoked=bool(revoked))
+        if revoked or not await self._is_current_generation(decoded_token):
+            return TOKEN_REVOKED, decoded_token
+        return exp - datetime.now(timezone.utc).timestamp(), decoded_token
+
+    async def create_user(self) -> models.DTOResponse:
+        try:
+
+            # body was decoded and validated into the route model by the view
+            user_auth_request : models.UserAuthRequest = self._data
 
             username = user_auth_request.username
             password = user_auth_request.password
 
-            # User exists check
-            if redis_client.exists(username):
+            # Atomic create-if-absent in a single store round trip
+            hashed_password = await password_hasher.hash(password)
+            if not await self._users.create(username, hashed_password):
                 error = f"User already exists"
                 self._controller_response.statusCode = HTTPStatus.BAD_REQUEST
                 self._controller_response.message = error
                 return self._controller_response
-            
-            redis_client.set(username, password)
+
             message = f"User {username} stored successfully"
-            logger.info(f"Controller:create_user():: {message}")
+            logger.info("Controller:create_user():: %s", message)
             
             self._controller_response.statusCode = HTTPStatus.CREATED
             self._controller_response.message = message
+        except HasherOverloaded:
+            self._controller_response.statusCode = HTTPStatus.SERVICE_UNAVAILABLE
+            self._controller_response.message = "Server is busy, please retry"
+        except StoreUnavailable:
+            self._controller_response.statusCode = HTTPStatus.SERVICE_UNAVAILABLE
+            self._controller_response.message = "Storage unavailable, please retry"
         except Exception as e:
             error = f"Error while creating the user : {e=}"
-            logger.error(f"Controller:create_user():: {error} traceId={self._trace_id} request={self._input_request} call_stack={traceback.format_exc()}")
+            logger.error("Controller:create_user():: %s request=%s", error, self._input_request, exc_info=True)
             self._controller_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
             self._controller_response.message = error
         
         return self._controller_response
 
-    def create_token(self) -> models.DTOResponse:
+    async def create_token(self) -> models.DTOResponse:
         try:
 
-            # request format validation on python
-            user_auth_request : models.UserAuthRequest = None
-            try:
-                user_auth_request : models.UserAuthRequest = models.UserAuthRequest(**self._data)
-            except Exception as e:
-                error = f"Invalid data field received. Error while creating the user {e}"
-                logger.error(
-                    f"Controller:create_token():: {error=} traceId={self._trace_id} request={self._input_request} call_stack={traceback.format_exc()}"
-                )
-                self._controller_response.statusCode = HTTPStatus.BAD_REQUEST
-                self._controller_response.message = error
-                return self._controller_response
+            # body was decoded and validated into the route model by the view
+            user_auth_request : models.UserAuthRequest = self._data
 
 
             username = user_auth_request.username
             password = user_auth_request.password
 
-            stored_password = redis_client.get(username)
-            if not stored_password or stored_password != password:
+            stored_password, generation = await self._users.get_credentials(username)
+            generation = generation_table.update(username, generation)
+            if not await self._verify_credentials(username, password, stored_password):
                 error = f"Invalid credentials received. Error while creating the token"
                 logger.error(
-                    f"Controller:create_token():: {error=} traceId={self._trace_id} request={self._input_request}"
+                    "Controller:create_token():: error=%r request=%s", error, self._input_request
                 )
                 self._controller_response.statusCode = HTTPStatus.BAD_REQUEST
                 self._controller_response.message = error
@@ -113,78 +193,76 @@ class Controller:
             
             # Generate JWT token
             access_token_expires = datetime.now(timezone.utc) + timedelta(minutes=int(env_vars.ACCESS_TOKEN_EXPIRE_MINUTES))
-            access_token = jwt.encode({"sub": username, "exp": access_token_expires}, env_vars.SECRET_KEY, algorithm=env_vars.ALGORITHM)
+            access_token = self._encode_token(username, access_token_expires, generation, access_keys)
             
             # Generate Refresh Token
             refresh_token_expires = datetime.now(timezone.utc) + timedelta(days=int(env_vars.REFRESH_TOKEN_EXPIRE_DAYS))
-            refresh_token = jwt.encode({"sub": username, "exp": refresh_token_expires}, env_vars.SECRET_KEY, algorithm=env_vars.ALGORITHM)
+            refresh_token = self._encode_token(username, refresh_token_expires, generation, refresh_keys)
             
             message = f"Token created successfully for {username}"
-            logger.info(f"Controller:create_user():: {message}")
+            logger.info("Controller:create_user():: %s", message)
             self._controller_response.message = message
             self._controller_response.statusCode = HTTPStatus.CREATED
             self._controller_response.data = [{"access_token": access_token, "refresh_token": refresh_token}]
-
+        except HasherOverloaded:
+            self._controller_response.statusCode = HTTPStatus.SERVICE_UNAVAILABLE
+            self._controller_response.message = "Server is busy, please retry"
+        except StoreUnavailable:
+            self._controller_response.statusCode = HTTPStatus.SERVICE_UNAVAILABLE
+            self._controller_response.message = "Storage unavailable, please retry"
         except Exception as e:
             error = f"Error while creating the token : {e=}"
-            logger.error(f"create_token():: {error} traceId={self._trace_id} request={self._input_request} call_stack={traceback.format_exc()}")
+            logger.error("create_token():: %s request=%s", error, self._input_request, exc_info=True)
             self._controller_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
             self._controller_response.message = error
         
         return self._controller_response
     
-    def revoke_token(self) -> models.DTOResponse:
+    async def revoke_token(self) -> models.DTOResponse:
         try:
 
-            token_revoke_request : models.TokenRequest = None
-            try:
-                token_revoke_request : models.TokenRequest = models.TokenRequest(**self._data)
-            except Exception as e:
-                error = f"Invalid data field received. Error while revoking the token {e}"
-                logger.error(
-                    f"Controller:revoke_token():: {error=} traceId={self._trace_id} request={self._input_request} call_stack={traceback.format_exc()}"
-                )
-                self._controller_response.statusCode = HTTPStatus.BAD_REQUEST
-                self._controller_response.message = error
-                return self._controller_response
+            # body was decoded and validated into the route model by the view
+            token_revoke_request : models.TokenRequest = self._data
             
             token = token_revoke_request.token
-            decoded_token = jwt.decode(token, env_vars.SECRET_KEY, algorithms=[env_vars.ALGORITHM])
+            decoded_token = decode_token(token, access_keys, refresh_keys)
             exp = decoded_token.get("exp")
-            redis_client.setex(token, int(exp - datetime.now(timezone.utc).timestamp()), "revoked")
+            revocation_id = get_revocation_id(token, decoded_token)
+            await self._revocations.revoke(revocation_id, exp)
+            token_cache.put(token, decoded_token, revocation_id, revoked=True)
             self._controller_response.message = "Token revoked successfully"
             self._controller_response.statusCode = HTTPStatus.OK
         except jwt.ExpiredSignatureError:
             self._controller_response.message = "Token already expired"
             self._controller_response.statusCode = HTTPStatus.BAD_REQUEST
+        except StoreUnavailable:
+            self._controller_response.statusCode = HTTPStatus.SERVICE_UNAVAILABLE
+            self._controller_response.message = "Storage unavailable, please retry"
         except Exception as e:
             error = f"Error while revoking the token : {e=}"
-            logger.error(f"Controller:revoke_token():: {error} traceId={self._trace_id} request={self._input_request} call_stack={traceback.format_exc()}")
+            logger.error("Controller:revoke_token():: %s request=%s", error, self._input_request, exc_info=True)
             self._controller_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
             self._controller_response.message = error
         return self._controller_response
 
-    def renew_token(self) -> models.DTOResponse:
+    async def renew_token(self) -> models.DTOResponse:
         try:
-            token_renew_request : models.TokenRequest = None
-            try:
-                token_renew_request : models.TokenRequest = models.TokenRequest(**self._data)
-            except Exception as e:
-                error = f"Invalid data field received. Error while renewing the token {e}"
-                logger.error(
-                    f"Controller:renew_token():: {error=} traceId={self._trace_id} request={self._input_request} call_stack={traceback.format_exc()}"
-                )
-                self._controller_response.statusCode = HTTPStatus.BAD_REQUEST
-                self._controller_response.message = error
-                return self._controller_response
+            # body was decoded and validated into the route model by the view
+            token_renew_request : models.TokenRequest = self._data
             
             refresh_token = token_renew_request.token
-            decoded_token = jwt.decode(refresh_token, env_vars.SECRET_KEY, algorithms=[env_vars.ALGORITHM])
+            decoded_token = decode_token(refresh_token, refresh_keys)
             username = decoded_token.get("sub")
+            generation = await generation_table.get(self._users, username)
+            if decoded_token.get("gen", 0) < generation:
+                self._controller_response.message = "Refresh token has been revoked"
+                self._controller_response.statusCode = HTTPStatus.UNAUTHORIZED
+                return self._controller_response
+
             new_access_token_expires = datetime.now(timezone.utc) + timedelta(minutes=int(env_vars.ACCESS_TOKEN_EXPIRE_MINUTES))
-            new_access_token = jwt.encode({"sub": username, "exp": new_access_token_expires}, env_vars.SECRET_KEY, algorithm=env_vars.ALGORITHM)
+            new_access_token = self._encode_token(username, new_access_token_expires, generation, access_keys)
             message = f"New access token generated successfully"
-            logger.info(f"Controller:renew_token():: {message}")
+            logger.info("Controller:renew_token():: %s", message)
 
             self._controller_response.message = message
             self._controller_response.statusCode = HTTPStatus.OK
@@ -192,69 +270,305 @@ class Controller:
         except jwt.ExpiredSignatureError:
             self._controller_response.message = "Refresh token expired"
             self._controller_response.statusCode = HTTPStatus.UNAUTHORIZED
+        except jwt.InvalidTokenError:
+            self._controller_response.message = "Invalid refresh token"
+            self._controller_response.statusCode = HTTPStatus.UNAUTHORIZED
+        except StoreUnavailable:
+            self._controller_response.statusCode = HTTPStatus.SERVICE_UNAVAILABLE
+            self._controller_response.message = "Storage unavailable, please retry"
         except Exception as e:
             error = f"Error while renewing the token : {e=}"
-            logger.error(f"Controller:renew_token():: {error} traceId={self._trace_id} request={self._input_request} call_stack={traceback.format_exc()}")
+            logger.error("Controller:renew_token():: %s request=%s", error, self._input_request, exc_info=True)
             self._controller_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
             self._controller_response.message = error
         return self._controller_response
     
 
-    def validate_token(self) -> models.DTOResponse:
+    async def revoke_user_sessions(self) -> models.DTOResponse:
         try:
-            if not self._input_request.get('token'):
-                error = f"Invalid request, token is required."
+
+            # body was decoded and validated into the route model by the view
+            user_auth_request : models.UserAuthRequest = self._data
+
+            username = user_auth_request.username
+            password = user_auth_request.password
+
+            stored_password, _ = await self._users.get_credentials(username)
+            if not await self._verify_credentials(username, password, stored_password):
+                error = "Invalid credentials received. Error while revoking the user sessions"
                 logger.error(
-                    f"Controller:validate_token():: {error=} request={self._input_request}"
+                    "Controller:revoke_user_sessions():: error=%r request=%s", error, self._input_request
                 )
                 self._controller_response.statusCode = HTTPStatus.BAD_REQUEST
                 self._controller_response.message = error
                 return self._controller_response
-            
-            token = self._input_request.get('token')
 
-            if redis_client.exists(token):
-                self._controller_response.message = "Token has been revoked"
-                self._controller_response.statusCode = HTTPStatus.UNAUTHORIZED
+            # Bumping the generation invalidates every access and refresh token minted so far
+            generation = await generation_table.bump(self._users, username)
+            message = f"All sessions revoked for {username}"
+            logger.info("Controller:revoke_user_sessions():: %s", message)
+
+            self._controller_response.message = message
+            self._controller_response.statusCode = HTTPStatus.OK
+            self._controller_response.data = [{"generation": generation}]
+        except HasherOverloaded:
+            self._controller_response.statusCode = HTTPStatus.SERVICE_UNAVAILABLE
+            self._controller_response.message = "Server is busy, please retry"
+        except StoreUnavailable:
+            self._controller_response.statusCode = HTTPStatus.SERVICE_UNAVAILABLE
+            self._controller_response.message = "Storage unavailable, please retry"
+        except Exception as e:
+            error = f"Error while revoking the user sessions : {e=}"
+            logger.error("Controller:revoke_user_sessions():: %s request=%s", error, self._input_request, exc_info=True)
+            self._controller_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
+            self._controller_response.message = error
+        return self._controller_response
+
+    @staticmethod
+    def _build_validity_response(token_validity_time) -> models.DTOResponse:
+        response = models.DTOResponse()
+        if token_validity_time == TOKEN_REVOKED:
+            response.message = "Token has been revoked"
+            response.statusCode = HTTPStatus.UNAUTHORIZED
+        elif token_validity_time > 0:
+            response.message = "Token validity checked successfully"
+            response.statusCode = HTTPStatus.OK
+            response.data = [{"remaining_validity_seconds": token_validity_time}]
+        elif token_validity_time == 0:
+            response.message = "Token has expired"
+            response.statusCode = HTTPStatus.UNAUTHORIZED
+        else:
+            response.message = "Error while validating"
+            response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
+        return response
+
+    def _check_batch_size(self, items) -> bool:
+        # Fills a 400 response and returns False when the batch is larger than BATCH_MAX_ITEMS
+        if len(items) > env_vars.BATCH_MAX_ITEMS:
+            error = f"Batch too large, at most {env_vars.BATCH_MAX_ITEMS} items are allowed"
+            self._controller_response.statusCode = HTTPStatus.BAD_REQUEST
+            self._controller_response.message = error
+            return False
+        return True
+
+    async def validate_tokens_batch(self) -> models.DTOResponse:
+        try:
+            batch_request : models.BatchTokenRequest = self._data
+            if not self._check_batch_size(batch_request.tokens):
                 return self._controller_response
 
-            token_validity_time = self._check_token_validity_time(token)
-            if token_validity_time > 0:
-                self._controller_response.message = "Token validity checked successfully"
-                self._controller_response.statusCode = HTTPStatus.OK
-                self._controller_response.data = [{"remaining_validity_seconds": token_validity_time}]
-            elif token_validity_time == 0:
-                self._controller_response.message = "Token has expired"
-                self._controller_response.statusCode = HTTPStatus.UNAUTHORIZED
-            else:
-                self._controller_response.message = "Error while validating"
-                self._controller_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
+            tokens = batch_request.tokens
+            now = datetime.now(timezone.utc).timestamp()
+            validity_times = [None] * len(tokens)
+            # index -> (decoded_token, revocation_id, revoked or None while the replica is catching up)
+            pending = {}
+
+            for index, token in enumerate(tokens):
+                cached = token_cache.get(token)
+                if cached is not None:
+                    decoded_token, revocation_id, revoked = cached
+                    revoked = revoked or revocation_replica.is_revoked(revocation_id)
+                    pending[index] = (decoded_token, revocation_id, bool(revoked))
+                    continue
+
+                decoded_token = self._decode_token(token)
+                if not isinstance(decoded_token, dict):
+                    validity_times[index] = decoded_token
+                    continue
+                revocation_id = get_revocation_id(token, decoded_token)
+                pending[index] = (decoded_token, revocation_id, revocation_replica.is_revoked(revocation_id))
+
+            # Revocation checks the replica could not answer and stale generations are each a single batched lookup
+            unresolved = [index for index, (_, _, revoked) in pending.items() if revoked is None]
+            usernames = list({
+                decoded_token.get("sub") for decoded_token, _, _ in pending.values()
+                if generation_table.peek(decoded_token.get("sub")) is None
+            })
+            # Both pipelines go out concurrently on separate pooled connections, the batch waits on the slower of the two
+            revoked_flags, generations = await asyncio.gather(
+                self._revocations.are_revoked([(pending[index][1], tokens[index]) for index in unresolved]) if unresolved else _no_lookups(),
+                self._users.get_generations(usernames) if usernames else _no_lookups()
+            )
+            for index, revoked in zip(unresolved, revoked_flags):
+                decoded_token, revocation_id, _ = pending[index]
+                pending[index] = (decoded_token, revocation_id, revoked)
+                token_cache.put(tokens[index], decoded_token, revocation_id, revoked=revoked)
+            for username, generation in zip(usernames, generations):
+                generation_table.update(username, generation)
+
+            for index, (decoded_token, revocation_id, revoked) in pending.items():
+                if revoked or not await self._is_current_generation(decoded_token):
+                    validity_times[index] = TOKEN_REVOKED
+                else:
+                    validity_times[index] = max(decoded_token.get("exp") - now, 0)
+
+            self._controller_response.message = f"Validated {len(tokens)} tokens"
+            self._controller_response.statusCode = HTTPStatus.OK
+            self._controller_response.data = [
+                self._build_validity_response(validity_time).model_dump(exclude_none=True) for validity_time in validity_times
+            ]
+        except StoreUnavailable:
+            self._controller_response.statusCode = HTTPStatus.SERVICE_UNAVAILABLE
+            self._controller_response.message = "Storage unavailable, please retry"
+        except Exception as e:
+            error = f"Error while validating the token batch : {e=}"
+            logger.error("Controller:validate_tokens_batch():: %s", error, exc_info=True)
+            self._controller_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
+            self._controller_response.message = error
+        return self._controller_response
+
+    async def revoke_tokens_batch(self) -> models.DTOResponse:
+        try:
+            batch_request : models.BatchTokenRequest = self._data
+            if not self._check_batch_size(batch_request.tokens):
+                return self._controller_response
+
+            results = []
+            revocations = []
+            revoked_tokens = []
+            for token in batch_request.tokens:
+                item_response = models.DTOResponse()
+                try:
+                    decoded_token = decode_token(token, access_keys, refresh_keys)
+                    revocation_id = get_revocation_id(token, decoded_token)
+                    revocations.append((revocation_id, decoded_token.get("exp")))
+                    revoked_tokens.append((token, decoded_token, revocation_id))
+                    item_response.message = "Token revoked successfully"
+                    item_response.statusCode = HTTPStatus.OK
+                except jwt.ExpiredSignatureError:
+                    item_response.message = "Token already expired"
+                    item_response.statusCode = HTTPStatus.BAD_REQUEST
+                except Exception as e:
+                    item_response.message = f"Error while revoking the token : {e=}"
+                    item_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
+                results.append(item_response.model_dump(exclude_none=True))
+
+            if revocations:
+                await self._revocations.revoke_many(revocations)
+            # Only cached once the store has the revocations, a failed write must not leave this worker disagreeing
+            for token, decoded_token, revocation_id in revoked_tokens:
+                token_cache.put(token, decoded_token, revocation_id, revoked=True)
+
+            self._controller_response.message = f"Processed {len(results)} token revocations"
+            self._controller_response.statusCode = HTTPStatus.OK
+            self._controller_response.data = results
+        except StoreUnavailable:
+            self._controller_response.statusCode = HTTPStatus.SERVICE_UNAVAILABLE
+            self._controller_response.message = "Storage unavailable, please retry"
+        except Exception as e:
+            error = f"Error while revoking the token batch : {e=}"
+            logger.error("Controller:revoke_tokens_batch():: %s", error, exc_info=True)
+            self._controller_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
+            self._controller_response.message = error
+        return self._controller_response
+
+    async def create_users_batch(self) -> models.DTOResponse:
+        try:
+            batch_request : models.BatchUserAuthRequest = self._data
+            if not self._check_batch_size(batch_request.users):
+                return self._controller_response
+
+            results = [None] * len(batch_request.users)
+            accepted = []
+            for index, user in enumerate(batch_request.users):
+                try:
+                    accepted.append((index, models.UserAuthRequest.model_validate(user)))
+                except ValidationError as e:
+                    results[index] = models.DTOResponse(
+                        message=f"Invalid data field received. Error while creating the user : {format_validation_errors(e)}",
+                        statusCode=HTTPStatus.BAD_REQUEST
+                    ).model_dump(exclude_none=True)
+
+            # Existing users are skipped before hashing, since hashing dominates the cost of an import
+            if accepted:
+                existing = await self._users.exists_many([user_auth_request.username for _, user_auth_request in accepted])
+                absent = [item for item, exists in zip(accepted, existing) if not exists]
+                for (index, _), exists in zip(accepted, existing):
+                    if exists:
+                        results[index] = models.DTOResponse(
+                            message="User already exists", statusCode=HTTPStatus.BAD_REQUEST
+                        ).model_dump(exclude_none=True)
+                accepted = absent
+
+            # Creation is an atomic create-if-absent, so concurrent imports of the same user cannot overwrite each other
+            if accepted:
+                hashed_passwords = await password_hasher.hash_many([user_auth_request.password for _, user_auth_request in accepted])
+                created = await self._users.create_many([
+                    (user_auth_request.username, hashed_password)
+                    for (_, user_auth_request), hashed_password in zip(accepted, hashed_passwords)
+                ])
+                for (index, user_auth_request), was_created in zip(accepted, created):
+                    if was_created:
+                        item_response = models.DTOResponse(
+                            message=f"User {user_auth_request.username} stored successfully",
+                            statusCode=HTTPStatus.CREATED
+                        )
+                    else:
+                        item_response = models.DTOResponse(message="User already exists", statusCode=HTTPStatus.BAD_REQUEST)
+                    results[index] = item_response.model_dump(exclude_none=True)
+
+            message = f"Processed {len(results)} users"
+            logger.info("Controller:create_users_batch():: %s", message)
+            self._controller_response.message = message
+            self._controller_response.statusCode = HTTPStatus.OK
+            self._controller_response.data = results
+        except HasherOverloaded:
+            self._controller_response.statusCode = HTTPStatus.SERVICE_UNAVAILABLE
+            self._controller_response.message = "Server is busy, please retry"
+        except StoreUnavailable:
+            self._controller_response.statusCode = HTTPStatus.SERVICE_UNAVAILABLE
+            self._controller_response.message = "Storage unavailable, please retry"
+        except Exception as e:
+            error = f"Error while creating the user batch : {e=}"
+            logger.error("Controller:create_users_batch():: %s", error, exc_info=True)
+            self._controller_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
+            self._controller_response.message = error
+        return self._controller_response
+
+    async def validate_token(self) -> models.DTOResponse:
+        try:
+            if not self._input_request.token:
+                error = f"Invalid request, token is required."
+                logger.error(
+                    "Controller:validate_token():: error=%r request=%s", error, self._input_request
+                )
+                self._controller_response.statusCode = HTTPStatus.BAD_REQUEST
+                self._controller_response.message = error
+                return self._controller_response
+            
+            token = self._input_request.token
+
+            token_validity_time = await self._get_token_validity(token)
+            self._controller_response = self._build_validity_response(token_validity_time)
+        except StoreUnavailable:
+            self._controller_response.statusCode = HTTPStatus.SERVICE_UNAVAILABLE
+            self._controller_response.message = "Storage unavailable, please retry"
         except Exception as e:
             error = f"Error while checking token validity : {e=}"
-            logger.error(f"Controller:validate_token():: {error} traceId={self._trace_id} request={self._input_request} call_stack={traceback.format_exc()}")
+            logger.error("Controller:validate_token():: %s request=%s", error, self._input_request, exc_info=True)
             self._controller_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
             self._controller_response.message = error
         return self._controller_response
     
-    def process_ping_pong(self) -> models.DTOResponse:
+    async def process_ping_pong(self) -> models.DTOResponse:
         try:
-            if not self._input_request.get('token'):
+            if not self._input_request.token:
                 error = f"Invalid request, token is required."
                 logger.error(
-                    f"Controller:validate_token():: {error=} request={self._input_request}"
+                    "Controller:validate_token():: error=%r request=%s", error, self._input_request
                 )
                 self._controller_response.statusCode = HTTPStatus.UNAUTHORIZED
                 self._controller_response.message = error
                 return self._controller_response
             
-            token = self._input_request.get('token')
+            token = self._input_request.token
 
-            if redis_client.exists(token):
+            token_validity_time = await self._get_token_validity(token)
+            if token_validity_time == TOKEN_REVOKED:
                 self._controller_response.message = "Token has been revoked"
                 self._controller_response.statusCode = HTTPStatus.UNAUTHORIZED
                 return self._controller_response
 
-            token_validity_time = self._check_token_validity_time(token)
             if token_validity_time > 0:
                 self._controller_response.message = "Succesfully played ping-pong with diwakar .... Good night"
                 self._controller_response.statusCode = HTTPStatus.OK
@@ -265,9 +579,12 @@ class Controller:
             else:
                 self._controller_response.message = "Error while processing ping-pong"
                 self._controller_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
+        except StoreUnavailable:
+            self._controller_response.statusCode = HTTPStatus.SERVICE_UNAVAILABLE
+            self._controller_response.message = "Storage unavailable, please retry"
         except Exception as e:
             error = f"Error while processing ping-pong : {e=}"
-            logger.error(f"Controller:process_ping_pong():: {error} traceId={self._trace_id} request={self._input_request} call_stack={traceback.format_exc()}")
+            logger.error("Controller:process_ping_pong():: %s request=%s", error, self._input_request, exc_info=True)
             self._controller_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
             self._controller_response.message = error
         return self._controller_response
\ No newline at end of file
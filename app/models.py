@@ -1,7 +1,9 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Union
+from typing import Optional, List, Generic, TypeVar
 from http import HTTPStatus
 
+T = TypeVar("T")
+
 class UserAuthRequest(BaseModel):
     username: str
     password: str
@@ -9,12 +11,28 @@ class UserAuthRequest(BaseModel):
 class TokenRequest(BaseModel):
     token: str
 
-class DTORequest(BaseModel):
-    traceId: str
-    data: Union[UserAuthRequest, TokenRequest]
+class BatchTokenRequest(BaseModel):
+    tokens: List[str]
+
+class BatchUserAuthRequest(BaseModel):
+    users: List[dict]
+
+class DTORequest(BaseModel, Generic[T]):
+    traceId: Optional[str] = Field(default=None)
+    data: T
+
+class HeaderTokenRequest(BaseModel):
+    token: Optional[str] = Field(default=None)
+
+
+# Per route request models, their validators are built once at import
+UserAuthDTORequest = DTORequest[UserAuthRequest]
+TokenDTORequest = DTORequest[TokenRequest]
+BatchTokenDTORequest = DTORequest[BatchTokenRequest]
+BatchUserAuthDTORequest = DTORequest[BatchUserAuthRequest]
 
 
 class DTOResponse(BaseModel):
     message: Optional[str] = Field(default=None)
     statusCode: Optional[HTTPStatus] = Field(default=None)
-    data: Optional[List] = Field(default=None)
\ No newline at end of file
+    data: Optional[List] = Field(default=None)
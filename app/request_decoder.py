@@ -0,0 +1,45 @@
+from fastapi import Request
+from http import HTTPStatus
+from pydantic import BaseModel, ValidationError
+
+
+class RequestDecodeError(Exception):
+    """Raised for oversized or malformed bodies, before any Controller work or logging happens"""
+
+    def __init__(self, status_code: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+async def _read_body(request: Request, max_bytes: int) -> bytes:
+    content_length = request.headers.get("content-length")
+    if content_length is not None and content_length.isdigit() and int(content_length) > max_bytes:
+        raise RequestDecodeError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Request body exceeds {max_bytes} bytes")
+
+    # Chunked or lying clients are cut off as soon as the limit is crossed
+    chunks = []
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise RequestDecodeError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Request body exceeds {max_bytes} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def format_validation_errors(error: ValidationError) -> str:
+    # Input values are left out so passwords and tokens never reach the response or the logs
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in detail['loc']) or 'body'}: {detail['msg']}"
+        for detail in error.errors(include_url=False, include_input=False)
+    )
+
+
+async def decode_request(request: Request, model: type, max_bytes: int) -> BaseModel:
+    """Parses and validates the body straight from bytes into the route's model in a single pass"""
+    body = await _read_body(request, max_bytes)
+    try:
+        return model.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestDecodeError(HTTPStatus.BAD_REQUEST, f"Invalid request body received : {format_validation_errors(e)}")
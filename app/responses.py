@@ -0,0 +1,52 @@
+from fastapi.responses import Response
+from http import HTTPStatus
+
+import app.models as models
+import orjson
+
+JSON_MEDIA_TYPE = "application/json"
+
+# Fixed outcomes of the high volume routes, encoded once at import
+_CONSTANT_BODIES = {
+    (message, status_code): orjson.dumps({"message": message, "statusCode": int(status_code)})
+    for message, status_code in (
+        ("Token has been revoked", HTTPStatus.UNAUTHORIZED),
+        ("Token has expired", HTTPStatus.UNAUTHORIZED),
+        ("Invalid request, token is required.", HTTPStatus.BAD_REQUEST),
+        ("Invalid request, token is required.", HTTPStatus.UNAUTHORIZED),
+    )
+}
+
+
+def encode_response(api_response: models.DTOResponse) -> bytes:
+    """
+    Single pass replacement for JSONResponse(jsonable_encoder(model_dump(exclude_none=True))),
+    producing byte for byte the same body.
+    """
+    if api_response.data is None:
+        body = _CONSTANT_BODIES.get((api_response.message, api_response.statusCode))
+        if body is not None:
+            return body
+
+    content = {}
+    if api_response.message is not None:
+        content["message"] = api_response.message
+    if api_response.statusCode is not None:
+        content["statusCode"] = int(api_response.statusCode)
+    if api_response.data is not None:
+        content["data"] = api_response.data
+    return orjson.dumps(content)
+
+
+def build_json_response(api_response: models.DTOResponse, headers: dict = None) -> Response:
+    return Response(
+        content=encode_response(api_response),
+        status_code=api_response.statusCode,
+        media_type=JSON_MEDIA_TYPE,
+        headers=headers
+    )
+
+
+def build_rate_limited_response(retry_after: int) -> Response:
+    api_response = models.DTOResponse(message="Too many requests, please retry later", statusCode=HTTPStatus.TOO_MANY_REQUESTS)
+    return build_json_response(api_response, headers={"Retry-After": str(retry_after)})
@@ -1,36 +1,55 @@
 from fastapi import APIRouter, Request
-from utils.logger import logger
+from utils.logger import logger, trace_id_var
+from utils.metrics import stage, render_metrics
 from http import HTTPStatus
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response
+from app.responses import build_json_response, build_rate_limited_response
+from app.request_decoder import decode_request, RequestDecodeError
 from app.controller import Controller
-import traceback
+from utils.token_cache import token_cache
+from utils.rate_limiter import rate_limiter
+from utils.storage import storage_ready
+from utils.signing_keys import access_keys
+import utils.config as env_vars
+import hashlib
+import json
 import app.models as models
 
 router = APIRouter()
+# Served at the root, outside the versioned route prefix
+root_router = APIRouter()
+
+# Keys only change on restart, so the JWKS body and its ETag are encoded once per worker
+_jwks_body = json.dumps({"keys": access_keys.public_jwks()}, separators=(",", ":")).encode()
+_jwks_etag = f'"{hashlib.sha256(_jwks_body).hexdigest()[:32]}"'
 
 @router.post(path="/user", response_model=models.DTOResponse)
 async def register_user(request: Request) -> models.DTOResponse:
     api_response = models.DTOResponse()
     request_body = None
     try:
-        request_body = await request.json()
-        logger.info(f"register_user():: Received request to create the user : {request_body=}")
+        with stage("decode"):
+            request_body = await decode_request(request, models.UserAuthDTORequest, env_vars.REQUEST_BODY_MAX_BYTES)
+        trace_id_var.set(request_body.traceId)
+        retry_after = await rate_limiter.check(request, "user")
+        if retry_after:
+            return build_rate_limited_response(retry_after)
+        logger.info("register_user():: Received request to create the user : request_body=%s", request_body)
         request_controller = Controller(input_request=request_body)
-        api_response = request_controller.create_user()
-        return JSONResponse(
-            content=jsonable_encoder(api_response.model_dump(exclude_none=True)),
-            status_code=api_response.statusCode
-        )
+        api_response = await request_controller.create_user()
+        with stage("serialize"):
+            return build_json_response(api_response)
+    except RequestDecodeError as e:
+        api_response.statusCode = e.status_code
+        api_response.message = e.message
+        return build_json_response(api_response)
     except Exception as e:
         error = f"Error while creating the user : {e=}"
-        logger.error(f"register_user():: {error}, {request_body=}, call_stack={traceback.format_exc()}")
+        logger.error("register_user():: %s, request_body=%s", error, request_body, exc_info=True)
         api_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
         api_response.message = error
-        return JSONResponse(
-            content=jsonable_encoder(api_response.model_dump(exclude_none=True)),
-            status_code=api_response.statusCode
-        )
+        with stage("serialize"):
+            return build_json_response(api_response)
 
 
 @router.post(path="/token", response_model=models.DTOResponse)
@@ -38,23 +57,28 @@ async def generate_token(request: Request)  -> models.DTOResponse:
     api_response = models.DTOResponse()
     request_body = None
     try:
-        request_body = await request.json()
-        logger.info(f"generate_token():: Received request to create the token : {request_body=}")
+        with stage("decode"):
+            request_body = await decode_request(request, models.UserAuthDTORequest, env_vars.REQUEST_BODY_MAX_BYTES)
+        trace_id_var.set(request_body.traceId)
+        retry_after = await rate_limiter.check(request, "token", request_body.data.username)
+        if retry_after:
+            return build_rate_limited_response(retry_after)
+        logger.info("generate_token():: Received request to create the token : request_body=%s", request_body)
         request_controller = Controller(input_request=request_body)
-        api_response = request_controller.create_token()
-        return JSONResponse(
-            content=jsonable_encoder(api_response.model_dump(exclude_none=True)),
-            status_code=api_response.statusCode
-        )
+        api_response = await request_controller.create_token()
+        with stage("serialize"):
+            return build_json_response(api_response)
+    except RequestDecodeError as e:
+        api_response.statusCode = e.status_code
+        api_response.message = e.message
+        return build_json_response(api_response)
     except Exception as e:
         error = f"Error while creating the token : {e=}"
-        logger.error(f"generate_token():: {error}, {request_body=}, call_stack={traceback.format_exc()}")
+        logger.error("generate_token():: %s, request_body=%s", error, request_body, exc_info=True)
         api_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
         api_response.message = error
-        return JSONResponse(
-            content=jsonable_encoder(api_response.model_dump(exclude_none=True)),
-            status_code=api_response.statusCode
-        )
+        with stage("serialize"):
+            return build_json_response(api_response)
     
 
 @router.post(path="/token/revoke", response_model=models.DTOResponse)
@@ -62,23 +86,25 @@ async def token_revoke(request: Request)  -> models.DTOResponse:
     api_response = models.DTOResponse()
     request_body = None
     try:
-        request_body = await request.json()
-        logger.info(f"token_revoke():: Received request to revoke the token : {request_body=}")
+        with stage("decode"):
+            request_body = await decode_request(request, models.TokenDTORequest, env_vars.REQUEST_BODY_MAX_BYTES)
+        trace_id_var.set(request_body.traceId)
+        logger.info("token_revoke():: Received request to revoke the token : request_body=%s", request_body)
         request_controller = Controller(input_request=request_body)
-        api_response = request_controller.revoke_token()
-        return JSONResponse(
-            content=jsonable_encoder(api_response.model_dump(exclude_none=True)),
-            status_code=api_response.statusCode
-        )
+        api_response = await request_controller.revoke_token()
+        with stage("serialize"):
+            return build_json_response(api_response)
+    except RequestDecodeError as e:
+        api_response.statusCode = e.status_code
+        api_response.message = e.message
+        return build_json_response(api_response)
     except Exception as e:
         error = f"Error while revoking the token : {e=}"
-        logger.error(f"token_revoke():: {error}, {request_body=}, call_stack={traceback.format_exc()}")
+        logger.error("token_revoke():: %s, request_body=%s", error, request_body, exc_info=True)
         api_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
         api_response.message = error
-        return JSONResponse(
-            content=jsonable_encoder(api_response.model_dump(exclude_none=True)),
-            status_code=api_response.statusCode
-        )
+        with stage("serialize"):
+            return build_json_response(api_response)
     
 
 @router.post(path="/token/renew", response_model=models.DTOResponse)
@@ -86,66 +112,213 @@ async def token_renewal(request: Request)  -> models.DTOResponse:
     api_response = models.DTOResponse()
     request_body = None
     try:
-        request_body = await request.json()
-        logger.info(f"token_renewal():: Received request to renew the token : {request_body=}")
+        with stage("decode"):
+            request_body = await decode_request(request, models.TokenDTORequest, env_vars.REQUEST_BODY_MAX_BYTES)
+        trace_id_var.set(request_body.traceId)
+        logger.info("token_renewal():: Received request to renew the token : request_body=%s", request_body)
         request_controller = Controller(input_request=request_body)
-        api_response = request_controller.renew_token()
-        return JSONResponse(
-            content=jsonable_encoder(api_response.model_dump(exclude_none=True)),
-            status_code=api_response.statusCode
-        )
+        api_response = await request_controller.renew_token()
+        with stage("serialize"):
+            return build_json_response(api_response)
+    except RequestDecodeError as e:
+        api_response.statusCode = e.status_code
+        api_response.message = e.message
+        return build_json_response(api_response)
     except Exception as e:
         error = f"Error while renewing the token : {e=}"
-        logger.error(f"token_renewal():: {error}, {request_body=}, call_stack={traceback.format_exc()}")
+        logger.error("token_renewal():: %s, request_body=%s", error, request_body, exc_info=True)
         api_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
         api_response.message = error
-        return JSONResponse(
-            content=jsonable_encoder(api_response.model_dump(exclude_none=True)),
-            status_code=api_response.statusCode
-        )
+        with stage("serialize"):
+            return build_json_response(api_response)
+
+@router.post(path="/user/sessions/revoke", response_model=models.DTOResponse)
+async def user_sessions_revoke(request: Request)  -> models.DTOResponse:
+    api_response = models.DTOResponse()
+    request_body = None
+    try:
+        with stage("decode"):
+            request_body = await decode_request(request, models.UserAuthDTORequest, env_vars.REQUEST_BODY_MAX_BYTES)
+        trace_id_var.set(request_body.traceId)
+        retry_after = await rate_limiter.check(request, "sessions", request_body.data.username)
+        if retry_after:
+            return build_rate_limited_response(retry_after)
+        logger.info("user_sessions_revoke():: Received request to revoke all sessions of the user : request_body=%s", request_body)
+        request_controller = Controller(input_request=request_body)
+        api_response = await request_controller.revoke_user_sessions()
+        with stage("serialize"):
+            return build_json_response(api_response)
+    except RequestDecodeError as e:
+        api_response.statusCode = e.status_code
+        api_response.message = e.message
+        return build_json_response(api_response)
+    except Exception as e:
+        error = f"Error while revoking the user sessions : {e=}"
+        logger.error("user_sessions_revoke():: %s, request_body=%s", error, request_body, exc_info=True)
+        api_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
+        api_response.message = error
+        with stage("serialize"):
+            return build_json_response(api_response)
 
 @router.get(path="/token/validate", response_model=models.DTOResponse)
 async def get_validity(request: Request)  -> models.DTOResponse:
     api_response = models.DTOResponse()
-    request_body = {}
+    request_body = None
     try:
-        request_body['token'] = request.headers.get('authorization')
-        logger.info(f"get_validity():: Received request to validate the token : {request_body=}")
+        request_body = models.HeaderTokenRequest(token=request.headers.get('authorization'))
+        trace_id_var.set(request.headers.get('x-trace-id'))
+        logger.info("get_validity():: Received request to validate the token : request_body=%s", request_body)
         request_controller = Controller(input_request=request_body)
-        api_response = request_controller.validate_token()
-        return JSONResponse(
-            content=jsonable_encoder(api_response.model_dump(exclude_none=True)),
-            status_code=api_response.statusCode
-        )
+        api_response = await request_controller.validate_token()
+        with stage("serialize"):
+            return build_json_response(api_response)
     except Exception as e:
         error = f"Error while validating the token : {e=}"
-        logger.error(f"get_validity():: {error}, {request_body=}, call_stack={traceback.format_exc()}")
+        logger.error("get_validity():: %s, request_body=%s", error, request_body, exc_info=True)
         api_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
         api_response.message = error
-        return JSONResponse(
-            content=jsonable_encoder(api_response.model_dump(exclude_none=True)),
-            status_code=api_response.statusCode
-        )
+        with stage("serialize"):
+            return build_json_response(api_response)
     
 @router.get(path="/ping-pong", response_model=models.DTOResponse)
 async def play_ping_pong(request: Request)  -> models.DTOResponse:
     api_response = models.DTOResponse()
-    request_body = {}
+    request_body = None
     try:
-        request_body['token'] = request.headers.get('authorization')
-        logger.info(f"play_ping_pong():: Received ping-pong request : {request_body=}")
+        request_body = models.HeaderTokenRequest(token=request.headers.get('authorization'))
+        trace_id_var.set(request.headers.get('x-trace-id'))
+        logger.info("play_ping_pong():: Received ping-pong request : request_body=%s", request_body)
         request_controller = Controller(input_request=request_body)
-        api_response = request_controller.process_ping_pong()
-        return JSONResponse(
-            content=jsonable_encoder(api_response.model_dump(exclude_none=True)),
-            status_code=api_response.statusCode
-        )
+        api_response = await request_controller.process_ping_pong()
+        with stage("serialize"):
+            return build_json_response(api_response)
     except Exception as e:
         error = f"Error while processing ping-pong : {e=}"
-        logger.error(f"play_ping_pong():: {error}, {request_body=}, call_stack={traceback.format_exc()}")
+        logger.error("play_ping_pong():: %s, request_body=%s", error, request_body, exc_info=True)
         api_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
         api_response.message = error
-        return JSONResponse(
-            content=jsonable_encoder(api_response.model_dump(exclude_none=True)),
-            status_code=api_response.statusCode
-        )
\ No newline at end of file
+        with stage("serialize"):
+            return build_json_response(api_response)
+
+@router.get(path="/token/cache/stats", response_model=models.DTOResponse)
+async def get_token_cache_stats(request: Request)  -> models.DTOResponse:
+    api_response = models.DTOResponse(
+        message="Token cache stats fetched successfully",
+        statusCode=HTTPStatus.OK,
+        data=[token_cache.stats()]
+    )
+    return build_json_response(api_response)
+
+
+@router.post(path="/user/batch", response_model=models.DTOResponse)
+async def register_users_batch(request: Request)  -> models.DTOResponse:
+    api_response = models.DTOResponse()
+    request_body = None
+    try:
+        with stage("decode"):
+            request_body = await decode_request(request, models.BatchUserAuthDTORequest, env_vars.BATCH_REQUEST_BODY_MAX_BYTES)
+        trace_id_var.set(request_body.traceId)
+        # Charged per user in the batch, against a budget of its own so a batch is not capped by the /user request limit
+        retry_after = await rate_limiter.check(
+            request, "user_batch", cost=len(request_body.data.users), ip_limit=env_vars.RATE_LIMIT_BATCH_USER_LIMIT
+        )
+        if retry_after:
+            return build_rate_limited_response(retry_after)
+        logger.info("register_users_batch():: Received request to create a batch of users")
+        request_controller = Controller(input_request=request_body)
+        api_response = await request_controller.create_users_batch()
+        with stage("serialize"):
+            return build_json_response(api_response)
+    except RequestDecodeError as e:
+        api_response.statusCode = e.status_code
+        api_response.message = e.message
+        return build_json_response(api_response)
+    except Exception as e:
+        error = f"Error while creating the user batch : {e=}"
+        logger.error("register_users_batch():: %s", error, exc_info=True)
+        api_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
+        api_response.message = error
+        with stage("serialize"):
+            return build_json_response(api_response)
+
+@router.post(path="/token/validate/batch", response_model=models.DTOResponse)
+async def get_validity_batch(request: Request)  -> models.DTOResponse:
+    api_response = models.DTOResponse()
+    request_body = None
+    try:
+        with stage("decode"):
+            request_body = await decode_request(request, models.BatchTokenDTORequest, env_vars.BATCH_REQUEST_BODY_MAX_BYTES)
+        trace_id_var.set(request_body.traceId)
+        logger.info("get_validity_batch():: Received request to validate a batch of tokens")
+        request_controller = Controller(input_request=request_body)
+        api_response = await request_controller.validate_tokens_batch()
+        with stage("serialize"):
+            return build_json_response(api_response)
+    except RequestDecodeError as e:
+        api_response.statusCode = e.status_code
+        api_response.message = e.message
+        return build_json_response(api_response)
+    except Exception as e:
+        error = f"Error while validating the token batch : {e=}"
+        logger.error("get_validity_batch():: %s", error, exc_info=True)
+        api_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
+        api_response.message = error
+        with stage("serialize"):
+            return build_json_response(api_response)
+
+@router.post(path="/token/revoke/batch", response_model=models.DTOResponse)
+async def token_revoke_batch(request: Request)  -> models.DTOResponse:
+    api_response = models.DTOResponse()
+    request_body = None
+    try:
+        with stage("decode"):
+            request_body = await decode_request(request, models.BatchTokenDTORequest, env_vars.BATCH_REQUEST_BODY_MAX_BYTES)
+        trace_id_var.set(request_body.traceId)
+        logger.info("token_revoke_batch():: Received request to revoke a batch of tokens")
+        request_controller = Controller(input_request=request_body)
+        api_response = await request_controller.revoke_tokens_batch()
+        with stage("serialize"):
+            return build_json_response(api_response)
+    except RequestDecodeError as e:
+        api_response.statusCode = e.status_code
+        api_response.message = e.message
+        return build_json_response(api_response)
+    except Exception as e:
+        error = f"Error while revoking the token batch : {e=}"
+        logger.error("token_revoke_batch():: %s", error, exc_info=True)
+        api_response.statusCode = HTTPStatus.INTERNAL_SERVER_ERROR
+        api_response.message = error
+        with stage("serialize"):
+            return build_json_response(api_response)
+
+
+@root_router.get(path="/.well-known/jwks.json")
+async def get_jwks(request: Request) -> Response:
+    # Only access token keys are published so downstream services never accept refresh tokens
+    headers = {
+        "Cache-Control": f"public, max-age={env_vars.JWKS_CACHE_MAX_AGE_SECONDS}",
+        "ETag": _jwks_etag
+    }
+    if request.headers.get("if-none-match") == _jwks_etag:
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+    return Response(content=_jwks_body, media_type="application/json", headers=headers)
+
+
+@root_router.get(path="/metrics")
+async def get_metrics(request: Request) -> Response:
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@root_router.get(path="/health/live", response_model=models.DTOResponse)
+async def get_liveness(request: Request) -> models.DTOResponse:
+    # Answering at all proves the worker's event loop is responsive
+    return build_json_response(models.DTOResponse(message="Alive", statusCode=HTTPStatus.OK))
+
+
+@root_router.get(path="/health/ready", response_model=models.DTOResponse)
+async def get_readiness(request: Request) -> models.DTOResponse:
+    if await storage_ready():
+        api_response = models.DTOResponse(message="Ready", statusCode=HTTPStatus.OK, data=[{"storage": env_vars.STORAGE_BACKEND}])
+    else:
+        api_response = models.DTOResponse(message="Storage is not reachable", statusCode=HTTPStatus.SERVICE_UNAVAILABLE)
+    return build_json_response(api_response)
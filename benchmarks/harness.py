@@ -0,0 +1,160 @@
+from collections import defaultdict
+import json
+import time
+
+
+class AsgiClient:
+    """
+    Calls the ASGI app in process, without sockets or an HTTP client library, so a run measures the app and not
+    the transport.
+    """
+
+    def __init__(self, app, client_ip: str = "127.0.0.1"):
+        self._app = app
+        self._client = (client_ip, 50000)
+
+    async def request(self, method: str, path: str, headers: dict = None, body: bytes = b""):
+        """Returns (status, body) of the response"""
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in (headers or {}).items()],
+            "client": self._client,
+            "server": ("benchmark", 80),
+        }
+        if body:
+            scope["headers"].append((b"content-type", b"application/json"))
+            scope["headers"].append((b"content-length", str(len(body)).encode()))
+
+        request_sent = False
+        response = {"status": 0, "body": []}
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+
+        await self._app(scope, receive, send)
+        return response["status"], b"".join(response["body"])
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class Recorder:
+    """Collects per operation latencies for one scenario and summarizes them as throughput, p50 and p99"""
+
+    def __init__(self):
+        self._latencies = defaultdict(list)
+        self._errors = defaultdict(int)
+        self._started = None
+        self._elapsed = 0.0
+
+    def start(self):
+        self._started = time.perf_counter()
+
+    def stop(self):
+        self._elapsed = time.perf_counter() - self._started
+
+    def record(self, operation: str, elapsed: float, ok: bool = True):
+        self._latencies[operation].append(elapsed)
+        if not ok:
+            self._errors[operation] += 1
+
+    @staticmethod
+    def _summarize(latencies: list, errors: int, elapsed: float) -> dict:
+        ordered = sorted(latencies)
+        return {
+            "requests": len(ordered),
+            "errors": errors,
+            "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentile(ordered, 0.50) * 1000, 4),
+            "p99_ms": round(percentile(ordered, 0.99) * 1000, 4),
+        }
+
+    def summary(self) -> dict:
+        all_latencies = [latency for latencies in self._latencies.values() for latency in latencies]
+        result = self._summarize(all_latencies, sum(self._errors.values()), self._elapsed)
+        result["duration_s"] = round(self._elapsed, 4)
+        result["operations"] = {
+            operation: self._summarize(latencies, self._errors[operation], self._elapsed)
+            for operation, latencies in sorted(self._latencies.items())
+        }
+        return result
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Returns (regressed, line) per scenario of results, regressed when throughput dropped or p99 grew by more than
+    tolerance (a fraction, 0.1 is 10%) against the baseline.
+    """
+    lines = []
+    for scenario, current in results.items():
+        previous = baseline.get(scenario)
+        if previous is None:
+            lines.append((False, f"{scenario:<28} new, no baseline"))
+            continue
+        throughput_change = _change(current["throughput_rps"], previous["throughput_rps"])
+        p99_change = _change(current["p99_ms"], previous["p99_ms"])
+        regressed = throughput_change < -tolerance or p99_change > tolerance
+        lines.append((regressed, (
+            f"{scenario:<28} rps {previous['throughput_rps']:>10.1f} -> {current['throughput_rps']:>10.1f} ({throughput_change:+.1%})"
+            f"  p99 {previous['p99_ms']:>9.3f} -> {current['p99_ms']:>9.3f} ms ({p99_change:+.1%})"
+            f"{'  REGRESSION' if regressed else ''}"
+        )))
+    return lines
+
+
+def _change(current: float, previous: float) -> float:
+    if not previous:
+        return 0.0
+    return (current - previous) / previous
+
+
+def format_report(results: dict) -> str:
+    lines = [f"{'scenario':<28} {'requests':>9} {'errors':>7} {'rps':>11} {'p50 ms':>9} {'p99 ms':>9}"]
+    for scenario, summary in results.items():
+        lines.append(
+            f"{scenario:<28} {summary['requests']:>9} {summary['errors']:>7} {summary['throughput_rps']:>11.1f}"
+            f" {summary['p50_ms']:>9.3f} {summary['p99_ms']:>9.3f}"
+        )
+        operations = summary.get("operations", {})
+        # Single operation scenarios are fully described by their own line
+        if len(operations) < 2:
+            continue
+        for operation, operation_summary in operations.items():
+            lines.append(
+                f"  {operation:<26} {operation_summary['requests']:>9} {operation_summary['errors']:>7}"
+                f" {operation_summary['throughput_rps']:>11.1f} {operation_summary['p50_ms']:>9.3f} {operation_summary['p99_ms']:>9.3f}"
+            )
+    return "\n".join(lines)
+
+
+def load_report(path: str) -> dict:
+    with open(path) as report_file:
+        return json.load(report_file)
+
+
+def save_report(path: str, results: dict):
+    with open(path, "w") as report_file:
+        json.dump(results, report_file, indent=2, sort_keys=True)
+        report_file.write("\n")
@@ -0,0 +1,199 @@
+from datetime import datetime, timezone, timedelta
+from http import HTTPStatus
+import asyncio
+import json
+import os
+import random
+import time
+import orjson
+
+import utils.config as env_vars
+from app.controller import Controller
+from utils.signing_keys import access_keys
+from benchmarks.harness import AsgiClient, Recorder
+
+ROUTE_PREFIX = "/advait-assignment/v1"
+BENCHMARK_PASSWORD = "benchmark-password"
+
+
+def _json_body(data: dict, trace_id: str = None) -> bytes:
+    return orjson.dumps({"traceId": trace_id, "data": data})
+
+
+def _response_data(body: bytes) -> dict:
+    try:
+        data = orjson.loads(body).get("data")
+    except (orjson.JSONDecodeError, AttributeError):
+        return {}
+    return data[0] if data and isinstance(data[0], dict) else {}
+
+
+async def _timed(client: AsgiClient, recorder: Recorder, operation: str, expected: int, method: str, path: str, headers: dict = None, body: bytes = b""):
+    started = time.perf_counter()
+    status, response_body = await client.request(method, path, headers, body)
+    recorder.record(operation, time.perf_counter() - started, ok=status == expected)
+    return status, response_body
+
+
+async def _run_workers(concurrency: int, jobs, job):
+    """Runs job(item) for every item of jobs with at most concurrency of them in flight"""
+    items = iter(jobs)
+
+    async def worker():
+        for item in items:
+            await job(item)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def run_lifecycle(app, users: int, concurrency: int, run_id: str) -> dict:
+    """Every virtual user goes register -> token -> validate -> renew -> revoke, timed per step"""
+    client = AsgiClient(app)
+    recorder = Recorder()
+
+    async def lifecycle(index: int):
+        username = f"bench-{run_id}-{index}"
+        credentials = _json_body({"username": username, "password": BENCHMARK_PASSWORD})
+        await _timed(client, recorder, "register", HTTPStatus.CREATED, "POST", f"{ROUTE_PREFIX}/user", body=credentials)
+        status, body = await _timed(client, recorder, "token", HTTPStatus.CREATED, "POST", f"{ROUTE_PREFIX}/token", body=credentials)
+        if status != HTTPStatus.CREATED:
+            return
+        tokens = _response_data(body)
+        await _timed(
+            client, recorder, "validate", HTTPStatus.OK, "GET", f"{ROUTE_PREFIX}/token/validate",
+            headers={"authorization": tokens["access_token"]}
+        )
+        await _timed(
+            client, recorder, "renew", HTTPStatus.OK, "POST", f"{ROUTE_PREFIX}/token/renew",
+            body=_json_body({"token": tokens["refresh_token"]})
+        )
+        await _timed(
+            client, recorder, "revoke", HTTPStatus.OK, "POST", f"{ROUTE_PREFIX}/token/revoke",
+            body=_json_body({"token": tokens["access_token"]})
+        )
+
+    recorder.start()
+    await _run_workers(concurrency, range(users), lifecycle)
+    recorder.stop()
+    return recorder.summary()
+
+
+async def run_token_mix(app, forward_auth: bool, requests: int, concurrency: int, hot_ratio: float, hot_tokens: int, seed: int, run_id: str) -> dict:
+    """
+    Validates a mix of hot tokens, a small set checked over and over like active sessions, and cold tokens each
+    checked once, against /token/validate or the forward-auth route.
+    """
+    client = AsgiClient(app)
+    username = f"bench-{run_id}-mix"
+    await client.request("POST", f"{ROUTE_PREFIX}/user", body=_json_body({"username": username, "password": BENCHMARK_PASSWORD}))
+
+    # Every token is minted up front so the timed loop only measures validation
+    expires = datetime.now(timezone.utc) + timedelta(minutes=int(env_vars.ACCESS_TOKEN_EXPIRE_MINUTES))
+    mint = lambda: Controller._encode_token(username, expires, 0, access_keys)
+    hot = [mint() for _ in range(max(hot_tokens, 1))]
+    rng = random.Random(seed)
+    plan = [rng.choice(hot) if rng.random() < hot_ratio else mint() for _ in range(requests)]
+
+    if forward_auth:
+        operation, path, expected = "forward_auth", f"{ROUTE_PREFIX}/token/auth", HTTPStatus.NO_CONTENT
+        headers_for = lambda token: {"authorization": f"Bearer {token}"}
+    else:
+        operation, path, expected = "validate", f"{ROUTE_PREFIX}/token/validate", HTTPStatus.OK
+        headers_for = lambda token: {"authorization": token}
+
+    recorder = Recorder()
+
+    async def validate(token: str):
+        await _timed(client, recorder, operation, expected, "GET", path, headers=headers_for(token))
+
+    recorder.start()
+    await _run_workers(concurrency, plan, validate)
+    recorder.stop()
+    return recorder.summary()
+
+
+def load_replay(path: str) -> dict:
+    """
+    Reads recorded requests, one JSON object per line:
+    {"session": "alice", "method": "POST", "path": "/advait-assignment/v1/token", "headers": {}, "body": {...}, "expect": 201}
+    Lines of a session replay in order, sessions replay concurrently. Strings may hold {{run}}, {{access_token}} and
+    {{refresh_token}}, the tokens being the last ones the session received.
+    """
+    sessions = {}
+    with open(path) as replay_file:
+        for line_number, line in enumerate(replay_file, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number} is not valid JSON : {e}") from e
+            sessions.setdefault(entry.get("session", "default"), []).append(entry)
+    return sessions
+
+
+def _substitute(value, variables: dict):
+    if isinstance(value, str):
+        for name, replacement in variables.items():
+            value = value.replace("{{" + name + "}}", replacement)
+        return value
+    if isinstance(value, dict):
+        return {key: _substitute(item, variables) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_substitute(item, variables) for item in value]
+    return value
+
+
+async def run_replay(app, path: str, concurrency: int, repeat: int, run_id: str) -> dict:
+    client = AsgiClient(app)
+    recorder = Recorder()
+    sessions = load_replay(path)
+
+    async def replay(job):
+        iteration, entries = job
+        variables = {"run": f"{run_id}-{iteration}", "access_token": "", "refresh_token": ""}
+        for entry in entries:
+            method = entry.get("method", "GET").upper()
+            request_path = _substitute(entry["path"], variables)
+            headers = _substitute(entry.get("headers") or {}, variables)
+            body = _substitute(entry.get("body"), variables)
+            operation = f"{method} {entry['path'].removeprefix(ROUTE_PREFIX)}"
+
+            started = time.perf_counter()
+            status, response_body = await client.request(method, request_path, headers, orjson.dumps(body) if body is not None else b"")
+            elapsed = time.perf_counter() - started
+            expected = entry.get("expect")
+            recorder.record(operation, elapsed, ok=status == expected if expected else status < HTTPStatus.INTERNAL_SERVER_ERROR)
+
+            data = _response_data(response_body)
+            for name in ("access_token", "refresh_token"):
+                if data.get(name):
+                    variables[name] = data[name]
+
+    jobs = [(iteration, entries) for iteration in range(repeat) for entries in sessions.values()]
+    recorder.start()
+    await _run_workers(concurrency, jobs, replay)
+    recorder.stop()
+    return recorder.summary()
+
+
+async def run_load(app, args) -> dict:
+    """Runs the enabled scenarios inside one application lifespan, against the in-memory storage backend"""
+    run_id = f"{os.getpid()}-{int(time.time())}"
+    results = {}
+    async with app.router.lifespan_context(app):
+        if "lifecycle" in args.scenarios:
+            results["load:lifecycle"] = await run_lifecycle(app, args.users, args.concurrency, run_id)
+        if "validate" in args.scenarios:
+            results["load:validate_mix"] = await run_token_mix(
+                app, False, args.requests, args.concurrency, args.hot_ratio, args.hot_tokens, args.seed, run_id
+            )
+        if "forward_auth" in args.scenarios:
+            results["load:forward_auth_mix"] = await run_token_mix(
+                app, True, args.requests, args.concurrency, args.hot_ratio, args.hot_tokens, args.seed, run_id
+            )
+        for replay_path in args.replay or []:
+            name = os.path.splitext(os.path.basename(replay_path))[0]
+            results[f"replay:{name}"] = await run_replay(app, replay_path, args.concurrency, args.repeat, run_id)
+    return results
@@ -0,0 +1,72 @@
+from datetime import datetime, timezone, timedelta
+import time
+
+import utils.config as env_vars
+from app.controller import Controller
+from utils.signing_keys import access_keys, refresh_keys, decode_token
+from utils.storage import init_storage, close_storage
+from utils.token_cache import token_cache
+from benchmarks.harness import Recorder
+
+
+def _access_token_expiry():
+    return datetime.now(timezone.utc) + timedelta(minutes=int(env_vars.ACCESS_TOKEN_EXPIRE_MINUTES))
+
+
+def _time_sync(recorder: Recorder, name: str, operation, iterations: int):
+    for _ in range(iterations):
+        started = time.perf_counter()
+        operation()
+        recorder.record(name, time.perf_counter() - started)
+
+
+async def _time_async(recorder: Recorder, name: str, operation, iterations: int):
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await operation()
+        recorder.record(name, time.perf_counter() - started)
+
+
+async def run_micro(iterations: int) -> dict:
+    """
+    Times the token primitives behind create_token and _get_token_validity one call at a time, each one reported
+    as its own micro:<name> scenario.
+    """
+    await init_storage()
+    try:
+        controller = Controller(input_request=None)
+        expires = _access_token_expiry()
+        tokens = [Controller._encode_token("benchmark", expires, 0, access_keys) for _ in range(iterations)]
+
+        cases = {
+            "mint_access": lambda: Controller._encode_token("benchmark", expires, 0, access_keys),
+            "mint_refresh": lambda: Controller._encode_token("benchmark", expires, 0, refresh_keys),
+            "verify_signature": lambda: decode_token(tokens[0], access_keys, refresh_keys),
+        }
+        results = {}
+        for name, operation in cases.items():
+            recorder = Recorder()
+            recorder.start()
+            _time_sync(recorder, name, operation, iterations)
+            recorder.stop()
+            results[f"micro:{name}"] = recorder.summary()
+
+        # Cold validity checks see every token once, so each one misses the cache and verifies the signature
+        token_cache.clear()
+        cold_tokens = iter(tokens)
+        recorder = Recorder()
+        recorder.start()
+        await _time_async(recorder, "validity_cold", lambda: controller._get_token_validity(next(cold_tokens)), iterations)
+        recorder.stop()
+        results["micro:validity_cold"] = recorder.summary()
+
+        # Hot validity checks repeat one token, served from the verified token cache
+        recorder = Recorder()
+        recorder.start()
+        await _time_async(recorder, "validity_hot", lambda: controller._get_token_validity(tokens[0]), iterations)
+        recorder.stop()
+        results["micro:validity_hot"] = recorder.summary()
+        return results
+    finally:
+        token_cache.clear()
+        await close_storage()
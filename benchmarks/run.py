@@ -0,0 +1,94 @@
+"""
+Benchmark suite for the token lifecycle, runs offline against the in-memory storage backend.
+
+    python -m benchmarks.run                                  # micro-benchmarks and every load scenario
+    python -m benchmarks.run --only micro --iterations 20000
+    python -m benchmarks.run --only load --concurrency 64 --requests 50000 --hot-ratio 0.9
+    python -m benchmarks.run --only load --scenarios none --replay benchmarks/replay_sample.jsonl --repeat 50
+    python -m benchmarks.run --output benchmarks/baseline.json   # record a baseline on the reference machine
+    python -m benchmarks.run --baseline benchmarks/baseline.json --tolerance 0.15
+
+Exits with status 1 when a scenario regressed against the baseline by more than the tolerance.
+"""
+import os
+from dotenv import load_dotenv
+
+# Settings are read at import by utils.config, so the benchmark environment is fixed before the app is imported.
+# .env still provides the signing settings, explicit environment variables win over both.
+load_dotenv()
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-benchmark-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "15")
+os.environ.setdefault("REFRESH_TOKEN_EXPIRE_DAYS", "1")
+
+import argparse
+import asyncio
+import sys
+
+from benchmarks.harness import compare, format_report, load_report, save_report
+
+LOAD_SCENARIOS = ("lifecycle", "validate", "forward_auth")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Token lifecycle micro-benchmarks and in-process load scenarios")
+    parser.add_argument("--only", choices=("micro", "load"), help="run only the micro-benchmarks or only the load scenarios")
+    parser.add_argument("--iterations", type=int, default=5000, help="calls per micro-benchmark")
+    parser.add_argument("--scenarios", default=",".join(LOAD_SCENARIOS), help=f"comma separated load scenarios out of {', '.join(LOAD_SCENARIOS)}, or none")
+    parser.add_argument("--concurrency", type=int, default=32, help="requests in flight at once")
+    parser.add_argument("--users", type=int, default=200, help="virtual users walking the full lifecycle")
+    parser.add_argument("--requests", type=int, default=20000, help="requests per token mix scenario")
+    parser.add_argument("--hot-ratio", type=float, default=0.9, help="share of token mix requests reusing a hot token")
+    parser.add_argument("--hot-tokens", type=int, default=100, help="size of the hot token set")
+    parser.add_argument("--seed", type=int, default=7, help="seed of the hot/cold token mix")
+    parser.add_argument("--replay", action="append", help="JSONL file of recorded requests to replay, may be repeated")
+    parser.add_argument("--repeat", type=int, default=1, help="times each replay session is replayed")
+    parser.add_argument("--output", help="write the results as JSON, usable later as a baseline")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed throughput drop or p99 growth, 0.1 is 10%%")
+    args = parser.parse_args(argv)
+
+    args.scenarios = {scenario.strip() for scenario in args.scenarios.split(",") if scenario.strip() and scenario.strip() != "none"}
+    unknown = args.scenarios - set(LOAD_SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios {', '.join(sorted(unknown))}")
+    return args
+
+
+async def run(args) -> dict:
+    # Imported here so the environment above is in place before utils.config is read
+    from benchmarks.micro import run_micro
+    from benchmarks.load import run_load
+    from main import app
+
+    results = {}
+    if args.only in (None, "micro"):
+        results.update(await run_micro(args.iterations))
+    if args.only in (None, "load"):
+        results.update(await run_load(app, args))
+    return results
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    print(format_report(results))
+
+    if args.output:
+        save_report(args.output, results)
+    if args.baseline:
+        lines = compare(results, load_report(args.baseline), args.tolerance)
+        print()
+        print(f"Compared against {args.baseline}, tolerance {args.tolerance:.0%}")
+        for _, line in lines:
+            print(line)
+        if any(regressed for regressed, _ in lines):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
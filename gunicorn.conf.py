@@ -0,0 +1,48 @@
+# Production launcher, run with: gunicorn -c gunicorn.conf.py main:app
+import math
+import os
+
+from dotenv import load_dotenv
+
+# utils.config is not imported here, it would read PASSWORD_HASH_WORKERS before the default below is set.
+# .env is loaded the same way it loads it, so STORAGE_BACKEND reads the same value.
+load_dotenv()
+
+
+def available_cpus() -> int:
+    # Honour CPU affinity and a cgroup v2 quota, os.cpu_count() reports the whole host inside containers
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as cpu_max:
+            quota, period = cpu_max.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+# Async workers are CPU bound, so one per core
+workers = int(os.getenv("WEB_CONCURRENCY", available_cpus()))
+# The memory backend keeps users and revocations inside the worker, a second worker would hold a different set
+if os.getenv("STORAGE_BACKEND", "redis").lower() == "memory":
+    workers = 1
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# App code, signing keys and the JWKS body are loaded once in the master and shared copy-on-write.
+# Redis pools, the revocation replica and hashing threads are created per worker in the FastAPI lifespan.
+preload_app = True
+
+# In-flight requests get this long to finish after SIGTERM before a worker is killed
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+timeout = int(os.getenv("WORKER_TIMEOUT", 60))
+keepalive = int(os.getenv("KEEPALIVE", 5))
+
+# Every worker already has its own cores, one hashing thread each avoids oversubscribing them
+os.environ.setdefault("PASSWORD_HASH_WORKERS", str(max(1, available_cpus() // workers)))
+
+
+def post_fork(server, worker):
+    from utils.logger import restart_logging
+    restart_logging()
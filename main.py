@@ -1,10 +1,29 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.views import router
+from app.views import router, root_router
+from utils.storage import init_storage, close_storage
+from utils.password_hasher import password_hasher
+from utils.logger import stop_logging
+from utils.metrics import MetricsMiddleware
+from app.forward_auth import ForwardAuthMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_storage()
+    yield
+    await close_storage()
+    password_hasher.close()
+    stop_logging()
 
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 route_prefix = "/advait-assignment/v1"
 
 # Include API router from views
-app.include_router(router, prefix=route_prefix)
\ No newline at end of file
+app.include_router(router, prefix=route_prefix)
+app.include_router(root_router)
+# Added before MetricsMiddleware so forward-auth subrequests are still timed
+app.add_middleware(ForwardAuthMiddleware, path=f"{route_prefix}/token/auth")
+app.add_middleware(MetricsMiddleware)
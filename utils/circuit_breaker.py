@@ -0,0 +1,96 @@
+from datetime import datetime, timezone
+from utils.metrics import Counter, register_gauges
+import utils.config as env_vars
+
+import asyncio
+import redis.exceptions
+
+
+class StoreUnavailable(Exception):
+    """Raised when a storage call times out, cannot connect, or is short-circuited by an open breaker"""
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and fails every call fast for reset_timeout seconds,
+    then lets a single probe through. A successful probe closes it again. Only failure_exceptions and timeouts
+    count as failures, any other error means the store answered and is raised to the caller unchanged.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float, failure_exceptions: tuple = (OSError,)):
+        self.name = name
+        self._failure_exceptions = (asyncio.TimeoutError, TimeoutError) + tuple(failure_exceptions)
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._unhealthy_since = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> int:
+        if self._opened_at is None:
+            return self.CLOSED
+        if datetime.now(timezone.utc).timestamp() - self._opened_at >= self._reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def unhealthy_for(self) -> float:
+        """Seconds since the current streak of failures started, 0 while healthy"""
+        if self._unhealthy_since is None:
+            return 0
+        return datetime.now(timezone.utc).timestamp() - self._unhealthy_since
+
+    def _record_success(self):
+        self._failures = 0
+        self._opened_at = None
+        self._unhealthy_since = None
+
+    def _record_failure(self):
+        now = datetime.now(timezone.utc).timestamp()
+        self._failures += 1
+        if self._unhealthy_since is None:
+            self._unhealthy_since = now
+        if self._failures >= self._failure_threshold or self._opened_at is not None:
+            self._opened_at = now
+
+    async def call(self, operation, timeout: float):
+        state = self.state
+        if state == self.OPEN or (state == self.HALF_OPEN and self._probe_in_flight):
+            breaker_rejections.inc((self.name,))
+            raise StoreUnavailable(f"{self.name} circuit is open")
+
+        probing = state == self.HALF_OPEN
+        self._probe_in_flight = self._probe_in_flight or probing
+        try:
+            result = await asyncio.wait_for(operation(), timeout=timeout)
+        except self._failure_exceptions as e:
+            self._record_failure()
+            breaker_failures.inc((self.name,))
+            raise StoreUnavailable(f"{self.name} call failed : {e!r}") from e
+        except Exception:
+            # e.g. WRONGTYPE or a bad argument, a request-specific error that says nothing about the store's health
+            self._record_success()
+            raise
+        finally:
+            if probing:
+                self._probe_in_flight = False
+        self._record_success()
+        return result
+
+
+breaker_failures = Counter("identity_circuit_breaker_failures_total", "Failed or timed out guarded calls", ("breaker",))
+breaker_rejections = Counter("identity_circuit_breaker_rejections_total", "Calls failed fast by an open breaker", ("breaker",))
+
+# Shared by every redis backed component of the worker
+store_breaker = CircuitBreaker(
+    name = "storage",
+    failure_threshold = env_vars.BREAKER_FAILURE_THRESHOLD,
+    reset_timeout = env_vars.BREAKER_RESET_TIMEOUT_SECONDS,
+    failure_exceptions = (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError, OSError)
+)
+register_gauges(lambda: [
+    ("identity_circuit_breaker_state", "0 closed, 1 open, 2 half open", store_breaker.state)
+])
@@ -9,4 +9,88 @@ ALGORITHM = os.getenv("ALGORITHM")
 REFRESH_TOKEN_EXPIRE_DAYS = os.getenv("REFRESH_TOKEN_EXPIRE_DAYS")
 REFRESH_SECRET_KEY = os.getenv("REFRESH_SECRET_KEY")
 REDIS_HOST = os.getenv("REDIS_HOST")
-REDIS_PORT = os.getenv("REDIS_PORT")
\ No newline at end of file
+REDIS_PORT = os.getenv("REDIS_PORT")
+# Async redis connection pool
+REDIS_POOL_MAX_CONNECTIONS = int(os.getenv("REDIS_POOL_MAX_CONNECTIONS", 100))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 2))
+REDIS_SOCKET_CONNECT_TIMEOUT = float(os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT", 2))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))
+
+# In-process verified token cache
+TOKEN_CACHE_CAPACITY = int(os.getenv("TOKEN_CACHE_CAPACITY", 10000))
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", 5))
+
+# Locally replicated revocation set
+REVOCATION_SET_KEY = os.getenv("REVOCATION_SET_KEY", "revoked_tokens")
+REVOCATION_CHANNEL = os.getenv("REVOCATION_CHANNEL", "token_revocations")
+REVOCATION_RESYNC_BACKOFF_SECONDS = float(os.getenv("REVOCATION_RESYNC_BACKOFF_SECONDS", 1))
+
+# Revocation by jti
+TOKEN_JTI_BYTES = int(os.getenv("TOKEN_JTI_BYTES", 8))
+REVOCATION_KEY_PREFIX = os.getenv("REVOCATION_KEY_PREFIX", "revoked:")
+
+# Per-user token generation
+GENERATION_CACHE_TTL_SECONDS = float(os.getenv("GENERATION_CACHE_TTL_SECONDS", 5))
+GENERATION_CACHE_CAPACITY = int(os.getenv("GENERATION_CACHE_CAPACITY", 100000))
+
+# Batch endpoints
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 1000))
+
+# Password hashing
+PASSWORD_HASH_N = int(os.getenv("PASSWORD_HASH_N", 2 ** 14))
+PASSWORD_HASH_R = int(os.getenv("PASSWORD_HASH_R", 8))
+PASSWORD_HASH_P = int(os.getenv("PASSWORD_HASH_P", 1))
+PASSWORD_HASH_LENGTH = int(os.getenv("PASSWORD_HASH_LENGTH", 32))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+PASSWORD_HASH_QUEUE_DEPTH = int(os.getenv("PASSWORD_HASH_QUEUE_DEPTH", 64))
+
+# Token signing keys, the *_SIGNING_KEYS are comma separated PEM paths with the active key first
+ACCESS_TOKEN_ALGORITHM = os.getenv("ACCESS_TOKEN_ALGORITHM", ALGORITHM)
+ACCESS_SIGNING_KEYS = os.getenv("ACCESS_SIGNING_KEYS")
+REFRESH_TOKEN_ALGORITHM = os.getenv("REFRESH_TOKEN_ALGORITHM", ALGORITHM)
+REFRESH_SIGNING_KEYS = os.getenv("REFRESH_SIGNING_KEYS")
+JWKS_CACHE_MAX_AGE_SECONDS = int(os.getenv("JWKS_CACHE_MAX_AGE_SECONDS", 300))
+
+# Logging pipeline, LOG_SAMPLE_RATES holds comma separated function:rate pairs e.g. "get_validity:0.01"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
+# Metrics, 0 disables slow request profiling
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", 0))
+
+# Request body size limits
+REQUEST_BODY_MAX_BYTES = int(os.getenv("REQUEST_BODY_MAX_BYTES", 16 * 1024))
+BATCH_REQUEST_BODY_MAX_BYTES = int(os.getenv("BATCH_REQUEST_BODY_MAX_BYTES", 1024 * 1024))
+
+# Rate limiting for /token and /user
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_KEY_PREFIX = os.getenv("RATE_LIMIT_KEY_PREFIX", "ratelimit:")
+RATE_LIMIT_WINDOW_SECONDS = int(os.getenv("RATE_LIMIT_WINDOW_SECONDS", 60))
+RATE_LIMIT_USER_LIMIT = int(os.getenv("RATE_LIMIT_USER_LIMIT", 10))
+RATE_LIMIT_IP_LIMIT = int(os.getenv("RATE_LIMIT_IP_LIMIT", 100))
+# /user/batch is counted per user created rather than per request, so a single batch may not exceed it
+RATE_LIMIT_BATCH_USER_LIMIT = int(os.getenv("RATE_LIMIT_BATCH_USER_LIMIT", BATCH_MAX_ITEMS))
+RATE_LIMIT_LOCAL_RATE = float(os.getenv("RATE_LIMIT_LOCAL_RATE", 20))
+RATE_LIMIT_LOCAL_BURST = float(os.getenv("RATE_LIMIT_LOCAL_BURST", 40))
+RATE_LIMIT_LOCAL_CAPACITY = int(os.getenv("RATE_LIMIT_LOCAL_CAPACITY", 100000))
+RATE_LIMIT_TRUST_FORWARDED_FOR = os.getenv("RATE_LIMIT_TRUST_FORWARDED_FOR", "false").lower() == "true"
+# Proxies in front of the app that each append to X-Forwarded-For, the client is the entry that many from the right
+RATE_LIMIT_TRUSTED_PROXY_HOPS = int(os.getenv("RATE_LIMIT_TRUSTED_PROXY_HOPS", 1))
+
+# Storage backend, redis or memory (single node, nothing survives a restart)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "redis").lower()
+USER_KEY_PREFIX = os.getenv("USER_KEY_PREFIX", "user:")
+STORAGE_LEGACY_FALLBACK = os.getenv("STORAGE_LEGACY_FALLBACK", "true").lower() == "true"
+
+# Health checks
+READINESS_TIMEOUT_SECONDS = float(os.getenv("READINESS_TIMEOUT_SECONDS", 1))
+
+# Storage resilience, STORE_TIMEOUTS holds comma separated method:seconds overrides e.g. "revoke_many:1"
+STORE_TIMEOUT_SECONDS = float(os.getenv("STORE_TIMEOUT_SECONDS", 0.25))
+STORE_TIMEOUTS = os.getenv("STORE_TIMEOUTS", "")
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RESET_TIMEOUT_SECONDS = float(os.getenv("BREAKER_RESET_TIMEOUT_SECONDS", 5))
+# fail_closed rejects validation while storage is down, fail_open trusts signature, exp and local revocation data
+DEGRADED_MODE = os.getenv("DEGRADED_MODE", "fail_closed").lower()
+DEGRADED_MAX_SECONDS = float(os.getenv("DEGRADED_MAX_SECONDS", 60))
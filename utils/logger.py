@@ -1,8 +1,120 @@
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from datetime import datetime, timezone
+
+import utils.config as env_vars
+
+import json
 import logging
+import queue
+import random
+
+REDACTED_FIELDS = {"password", "token", "access_token", "refresh_token", "authorization", "tokens"}
+REDACTED_VALUE = "***"
+
+# Bound per request by the views, picked up by every record logged while serving it
+trace_id_var: ContextVar = ContextVar("trace_id", default=None)
+
+
+def redact(value):
+    if hasattr(value, "model_dump"):
+        return redact(value.model_dump())
+    if isinstance(value, dict):
+        return {
+            key: REDACTED_VALUE if str(key).lower() in REDACTED_FIELDS else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as single line JSON. Runs on the listener thread, so message formatting stays off the event loop"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        if isinstance(record.args, tuple):
+            record.args = tuple(redact(arg) for arg in record.args)
+        elif isinstance(record.args, dict):
+            record.args = redact(record.args)
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "traceId": getattr(record, "traceId", None)
+        }
+        if record.exc_info:
+            entry["call_stack"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """Attaches the request's traceId and samples success logs per function"""
+
+    def __init__(self, sample_rates: dict):
+        super().__init__()
+        self._sample_rates = sample_rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            rate = self._sample_rates.get(record.funcName)
+            if rate is not None and random.random() >= rate:
+                return False
+        record.traceId = trace_id_var.get()
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the listener thread as is and drops them instead of blocking when the queue is full"""
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting is deferred to the JsonFormatter on the listener thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+def _parse_sample_rates(sample_rates: str) -> dict:
+    rates = {}
+    for pair in sample_rates.split(","):
+        if ":" in pair:
+            name, rate = pair.split(":", 1)
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+_stream_handler = logging.StreamHandler()
+_stream_handler.setFormatter(JsonFormatter())
+
+_queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=env_vars.LOG_QUEUE_SIZE))
+_queue_handler.addFilter(ContextFilter(_parse_sample_rates(env_vars.LOG_SAMPLE_RATES)))
+
+_listener = QueueListener(_queue_handler.queue, _stream_handler, respect_handler_level=True)
+_listener.start()
 
-# Configure logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO
-)
 logger = logging.getLogger("FastAPI-App")
+logger.setLevel(env_vars.LOG_LEVEL)
+logger.addHandler(_queue_handler)
+logger.propagate = False
+
+
+def restart_logging():
+    """Starts a fresh listener thread in a forked worker, threads do not survive the fork of a preloaded app"""
+    global _listener
+    _listener = QueueListener(_queue_handler.queue, _stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Flushes queued records, called from the FastAPI lifespan on shutdown"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
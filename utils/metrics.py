@@ -0,0 +1,141 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from utils.logger import logger
+import utils.config as env_vars
+
+import bisect
+import time
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# (kind, [(stage, seconds), ...]) of the request being served, set by MetricsMiddleware
+request_context_var: ContextVar = ContextVar("request_context", default=None)
+
+
+class Histogram:
+    """Cumulative bucket histogram keyed by a tuple of label values"""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._series: dict = {}
+
+    def observe(self, labels: tuple, value: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(BUCKETS) + 1), 0.0]
+        series[0][bisect.bisect_left(BUCKETS, value)] += 1
+        series[1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self._series.items():
+            label_text = ",".join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(BUCKETS, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+
+class Counter:
+
+    def __init__(self, name: str, help_text: str, label_names: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._series: dict = {}
+
+    def inc(self, labels: tuple, amount: int = 1):
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in self._series.items():
+            label_text = ",".join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+            lines.append(f"{self.name}{{{label_text}}} {value}")
+        return lines
+
+
+request_duration = Histogram("identity_request_duration_seconds", "Request latency per route", ("route", "status"))
+stage_duration = Histogram("identity_stage_duration_seconds", "Latency per route and request stage", ("route", "stage"))
+slow_requests = Counter("identity_slow_requests_total", "Requests slower than SLOW_REQUEST_THRESHOLD_MS", ("route",))
+
+# Callables returning [(name, help, value)], registered by the components that own the values.
+# Names ending in _total are exposed as counters, everything else as gauges
+_gauge_collectors: list = []
+
+
+def register_gauges(collector):
+    _gauge_collectors.append(collector)
+
+
+@contextmanager
+def stage(name: str):
+    context = request_context_var.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if context is None:
+            stage_duration.observe(("background", name), elapsed)
+        else:
+            # Observed by MetricsMiddleware once routing has resolved the route label
+            context[1].append((name, elapsed))
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request, cheaper than BaseHTTPMiddleware on the hot path"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        context = ("request", [])
+        token = request_context_var.set(context)
+        status = [0]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            request_duration.observe((route_path, str(status[0])), elapsed)
+            for stage_name, stage_elapsed in context[1]:
+                stage_duration.observe((route_path, stage_name), stage_elapsed)
+            if env_vars.SLOW_REQUEST_THRESHOLD_MS and elapsed * 1000 >= env_vars.SLOW_REQUEST_THRESHOLD_MS:
+                slow_requests.inc((route_path,))
+                logger.warning(
+                    "MetricsMiddleware:__call__():: Slow request route=%s status=%s elapsed_ms=%.2f stages=%s",
+                    route_path, status[0], elapsed * 1000,
+                    [(stage_name, round(stage_elapsed * 1000, 3)) for stage_name, stage_elapsed in context[1]]
+                )
+            request_context_var.reset(token)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in (request_duration, stage_duration, slow_requests):
+        lines.extend(metric.render())
+    for collector in _gauge_collectors:
+        for name, help_text, value in collector():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}")
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,126 @@
+from concurrent.futures import ThreadPoolExecutor
+from utils.metrics import register_gauges, stage
+import utils.config as env_vars
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+
+SCRYPT_PREFIX = "scrypt"
+
+
+class HasherOverloaded(Exception):
+    """Raised when the hashing queue is full and the request should be shed"""
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r * p, dklen=env_vars.PASSWORD_HASH_LENGTH
+    )
+
+
+def _hash_password(password: str) -> str:
+    n, r, p = env_vars.PASSWORD_HASH_N, env_vars.PASSWORD_HASH_R, env_vars.PASSWORD_HASH_P
+    salt = os.urandom(16)
+    digest = _scrypt(password, salt, n, r, p)
+    return "$".join([
+        SCRYPT_PREFIX, str(n), str(r), str(p),
+        base64.b64encode(salt).decode(), base64.b64encode(digest).decode()
+    ])
+
+
+_dummy_hash: str = None
+
+
+def _verify_password(password: str, stored_password: str):
+    """
+    Returns (matches, needs_rehash). Entries without the scrypt prefix are legacy plaintext passwords. Unknown users
+    (stored_password None) are checked against a throwaway hash so they cost as much as known ones.
+    """
+    global _dummy_hash
+    if stored_password is None:
+        if _dummy_hash is None:
+            _dummy_hash = _hash_password(os.urandom(16).hex())
+        _verify_password(password, _dummy_hash)
+        return False, False
+
+    if not stored_password.startswith(f"{SCRYPT_PREFIX}$"):
+        return hmac.compare_digest(password.encode(), stored_password.encode()), True
+
+    _, n, r, p, salt, digest = stored_password.split("$")
+    n, r, p = int(n), int(r), int(p)
+    matches = hmac.compare_digest(_scrypt(password, base64.b64decode(salt), n, r, p), base64.b64decode(digest))
+    needs_rehash = (n, r, p) != (env_vars.PASSWORD_HASH_N, env_vars.PASSWORD_HASH_R, env_vars.PASSWORD_HASH_P)
+    return matches, needs_rehash
+
+
+class PasswordHasher:
+    """
+    Runs scrypt on a bounded thread pool (hashlib releases the GIL while hashing) so the event loop never blocks.
+    At most workers + queue_depth jobs are admitted, anything beyond that raises HasherOverloaded.
+    """
+
+    def __init__(self, workers: int, queue_depth: int):
+        self._workers = workers
+        self._capacity = workers + queue_depth
+        self._in_flight = 0
+        self._executor: ThreadPoolExecutor = None
+
+    async def _submit(self, fn, *args):
+        if self._in_flight >= self._capacity:
+            raise HasherOverloaded("Password hashing queue is full")
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="password-hasher")
+
+        loop = asyncio.get_running_loop()
+        job = self._executor.submit(fn, *args)
+        self._in_flight += 1
+        # The slot is released when the thread finishes, a caller cancelled by a client disconnect keeps holding it
+        job.add_done_callback(lambda _: self._release(loop))
+        with stage("password_hash"):
+            return await asyncio.wrap_future(job)
+
+    def _release(self, loop):
+        try:
+            loop.call_soon_threadsafe(self._decrement)
+        except RuntimeError:
+            # The loop is already closed during shutdown, nothing is left to admit
+            pass
+
+    def _decrement(self):
+        self._in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(_hash_password, password)
+
+    async def hash_many(self, passwords: list) -> list:
+        # Every password is its own job and counts against the queue depth. A batch keeps at most one job per worker
+        # in flight, so logins submitted meanwhile queue behind a single hash rather than the whole import
+        hashes = []
+        for start in range(0, len(passwords), self._workers):
+            hashes.extend(await asyncio.gather(*(self.hash(password) for password in passwords[start:start + self._workers])))
+        return hashes
+
+    async def verify(self, password: str, stored_password: str):
+        return await self._submit(_verify_password, password, stored_password)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+# Per-worker hashing engine shared by every Controller instance
+password_hasher = PasswordHasher(
+    workers = env_vars.PASSWORD_HASH_WORKERS,
+    queue_depth = env_vars.PASSWORD_HASH_QUEUE_DEPTH
+)
+register_gauges(lambda: [
+    ("identity_password_hasher_in_flight", "Password hashing jobs running or queued", password_hasher.in_flight)
+])
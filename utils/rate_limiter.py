@@ -0,0 +1,171 @@
+from datetime import datetime, timezone
+from utils.logger import logger
+from utils.metrics import Counter, register_gauges
+from utils.redis_client import get_redis
+from utils.circuit_breaker import store_breaker, StoreUnavailable
+import utils.config as env_vars
+
+import math
+
+# Approximate sliding window over two fixed windows per limited key. KEYS come in (current, previous) pairs,
+# one pair per limit in ARGV. ARGV[4] is what the request costs, 1 for a single request. Nothing is counted unless
+# every limit passes, so throttled attempts stay cheap.
+SLIDING_WINDOW_SCRIPT = """
+local elapsed = tonumber(ARGV[1])
+local window_ms = tonumber(ARGV[2])
+local retry_ms = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+for i = 1, #KEYS, 2 do
+    local limit = tonumber(ARGV[4 + (i + 1) / 2])
+    local current = tonumber(redis.call('GET', KEYS[i]) or '0')
+    local previous = tonumber(redis.call('GET', KEYS[i + 1]) or '0')
+    if previous * (1 - elapsed) + current + cost - 1 >= limit then
+        return retry_ms
+    end
+end
+for i = 1, #KEYS, 2 do
+    redis.call('INCRBY', KEYS[i], cost)
+    redis.call('PEXPIRE', KEYS[i], window_ms * 2)
+end
+return 0
+"""
+
+rate_limited = Counter("identity_rate_limited_total", "Requests rejected with 429", ("route", "scope"))
+
+
+class LocalTokenBucket:
+    """Per worker token bucket per client IP, absorbs floods before they cost a redis round trip"""
+
+    def __init__(self, rate: float, burst: float, capacity: int):
+        self._rate = rate
+        self._burst = burst
+        self._capacity = capacity
+        self._buckets: dict = {}
+
+    def take(self, key: str) -> float:
+        """Returns 0 when a token was taken, otherwise the seconds until the next token is available"""
+        now = datetime.now(timezone.utc).timestamp()
+        tokens, updated_at = self._buckets.get(key, (self._burst, now))
+        tokens = min(self._burst, tokens + (now - updated_at) * self._rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / self._rate
+
+        if len(self._buckets) >= self._capacity and key not in self._buckets:
+            # Full buckets only refill, so dropping the table just forgives idle clients
+            self._buckets.clear()
+        self._buckets[key] = (tokens - 1, now)
+        return 0
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class LocalSlidingWindow:
+    """In-process equivalent of SLIDING_WINDOW_SCRIPT for the memory storage backend"""
+
+    def __init__(self):
+        self._counts: dict = {}
+        self._window = None
+
+    def check(self, keys: list, elapsed: float, retry_ms: int, limits: list, window: int, cost: int = 1) -> int:
+        if window != self._window:
+            # Only the current and previous windows are ever read
+            self._counts = {key: count for key, count in self._counts.items() if key.endswith(f":{window - 1}")}
+            self._window = window
+        for i, limit in enumerate(limits):
+            current = self._counts.get(keys[2 * i], 0)
+            previous = self._counts.get(keys[2 * i + 1], 0)
+            if previous * (1 - elapsed) + current + cost - 1 >= limit:
+                return retry_ms
+        for i in range(len(limits)):
+            self._counts[keys[2 * i]] = self._counts.get(keys[2 * i], 0) + cost
+        return 0
+
+
+class RateLimiter:
+
+    def __init__(self):
+        self._local_bucket = LocalTokenBucket(
+            rate = env_vars.RATE_LIMIT_LOCAL_RATE,
+            burst = env_vars.RATE_LIMIT_LOCAL_BURST,
+            capacity = env_vars.RATE_LIMIT_LOCAL_CAPACITY
+        )
+        self._local_window = LocalSlidingWindow()
+        self._script = None
+        self._script_client = None
+
+    @staticmethod
+    def client_ip(request) -> str:
+        if env_vars.RATE_LIMIT_TRUST_FORWARDED_FOR:
+            forwarded_for = request.headers.get("x-forwarded-for")
+            if forwarded_for:
+                # Entries left of those our own proxies appended are whatever the client sent, and cannot be trusted
+                entries = [entry.strip() for entry in forwarded_for.split(",")]
+                return entries[max(len(entries) - env_vars.RATE_LIMIT_TRUSTED_PROXY_HOPS, 0)]
+        return request.client.host if request.client else "unknown"
+
+    def _sliding_window(self, redis_client):
+        if self._script_client is not redis_client:
+            self._script = redis_client.register_script(SLIDING_WINDOW_SCRIPT)
+            self._script_client = redis_client
+        return self._script
+
+    async def check(self, request, route: str, username: str = None, cost: int = 1, ip_limit: int = None) -> int:
+        """
+        Returns 0 when the request may proceed, otherwise the Retry-After seconds for a 429. cost is how many units
+        the request takes from the sliding windows, ip_limit replaces RATE_LIMIT_IP_LIMIT for the route.
+        """
+        if not env_vars.RATE_LIMIT_ENABLED:
+            return 0
+
+        client_ip = self.client_ip(request)
+        retry_after = self._local_bucket.take(client_ip)
+        if retry_after:
+            rate_limited.inc((route, "local"))
+            return math.ceil(retry_after)
+
+        window_ms = env_vars.RATE_LIMIT_WINDOW_SECONDS * 1000
+        now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+        window, offset = divmod(now_ms, window_ms)
+
+        if ip_limit is None:
+            ip_limit = env_vars.RATE_LIMIT_IP_LIMIT
+        limits = [(f"{env_vars.RATE_LIMIT_KEY_PREFIX}{route}:ip:{client_ip}", ip_limit)]
+        if username is not None:
+            limits.append((f"{env_vars.RATE_LIMIT_KEY_PREFIX}{route}:user:{username}", env_vars.RATE_LIMIT_USER_LIMIT))
+        keys = []
+        for key, _ in limits:
+            keys.extend([f"{key}:{window}", f"{key}:{window - 1}"])
+
+        try:
+            if env_vars.STORAGE_BACKEND == "memory":
+                retry_ms = self._local_window.check(
+                    keys, offset / window_ms, window_ms - offset, [limit for _, limit in limits], window, cost
+                )
+            else:
+                retry_ms = await store_breaker.call(
+                    lambda: self._sliding_window(get_redis())(
+                        keys = keys,
+                        args = [offset / window_ms, window_ms, window_ms - offset, cost] + [limit for _, limit in limits]
+                    ),
+                    env_vars.STORE_TIMEOUT_SECONDS
+                )
+        except StoreUnavailable:
+            # Throttling must not take logins down with it when redis misbehaves, the breaker metrics report it
+            return 0
+        except Exception as e:
+            logger.error("RateLimiter:check():: Sliding window check failed, allowing request : e=%r", e)
+            return 0
+
+        if retry_ms:
+            rate_limited.inc((route, "redis"))
+            return math.ceil(int(retry_ms) / 1000)
+        return 0
+
+
+# Per-worker limiter shared by the rate limited views
+rate_limiter = RateLimiter()
+register_gauges(lambda: [
+    ("identity_rate_limit_local_buckets", "Client IPs tracked by the local token bucket", len(rate_limiter._local_bucket))
+])
@@ -0,0 +1,81 @@
+from redis.asyncio.client import Pipeline
+import redis.asyncio as redis
+import utils.config as env_vars
+
+from utils.logger import logger, NonBlockingQueueHandler
+from utils.metrics import register_gauges, stage
+
+
+class InstrumentedPipeline(Pipeline):
+
+    async def execute(self, raise_on_error: bool = True):
+        with stage("redis"):
+            return await super().execute(raise_on_error)
+
+
+class InstrumentedRedis(redis.Redis):
+    """Records every command and pipeline round trip under the redis stage"""
+
+    async def execute_command(self, *args, **options):
+        with stage("redis"):
+            return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+# Shared connection pool, created and closed by the FastAPI lifespan in main.py
+redis_pool: redis.ConnectionPool = None
+redis_client: redis.Redis = None
+
+
+def _pool_gauges():
+    if redis_pool is None:
+        return []
+    return [
+        ("identity_redis_pool_max_connections", "Configured redis pool size", redis_pool.max_connections),
+        ("identity_redis_pool_in_use_connections", "Redis connections checked out", len(redis_pool._in_use_connections)),
+        ("identity_redis_pool_available_connections", "Idle redis connections", len(redis_pool._available_connections))
+    ]
+
+
+register_gauges(_pool_gauges)
+register_gauges(lambda: [("identity_logs_dropped_total", "Log records dropped on a full queue", NonBlockingQueueHandler.dropped)])
+
+
+async def init_redis_pool() -> redis.Redis:
+    global redis_pool, redis_client
+    if redis_client is not None:
+        return redis_client
+
+    redis_pool = redis.ConnectionPool(
+        host = env_vars.REDIS_HOST,
+        port = int(env_vars.REDIS_PORT),
+        db = 0,
+        decode_responses = True,
+        max_connections = env_vars.REDIS_POOL_MAX_CONNECTIONS,
+        socket_timeout = env_vars.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout = env_vars.REDIS_SOCKET_CONNECT_TIMEOUT,
+        health_check_interval = env_vars.REDIS_HEALTH_CHECK_INTERVAL,
+        retry_on_timeout = True
+    )
+    redis_client = InstrumentedRedis(connection_pool=redis_pool)
+    logger.info("init_redis_pool():: Redis pool created max_connections=%s", env_vars.REDIS_POOL_MAX_CONNECTIONS)
+    return redis_client
+
+
+async def close_redis_pool():
+    global redis_pool, redis_client
+    if redis_client is not None:
+        await redis_client.aclose()
+    if redis_pool is not None:
+        await redis_pool.disconnect()
+    redis_client = None
+    redis_pool = None
+    logger.info("close_redis_pool():: Redis pool closed")
+
+
+def get_redis() -> redis.Redis:
+    if redis_client is None:
+        raise RuntimeError("Redis pool is not initialized")
+    return redis_client
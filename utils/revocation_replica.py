@@ -0,0 +1,121 @@
+from datetime import datetime, timezone
+from utils.logger import logger
+from utils.metrics import register_gauges
+import utils.config as env_vars
+
+import asyncio
+import hashlib
+import heapq
+
+LEGACY_REVOCATION_PREFIX = "legacy:"
+
+
+class RevocationReplica:
+    """
+    Worker-local copy of the revoked token id set. It is hydrated from the redis sorted set on startup and
+    kept current through the revocation pub/sub channel. Entries are dropped once the token's exp passes.
+    """
+
+    def __init__(self):
+        self._revoked: dict = {}
+        self._expiry_heap: list = []
+        self._task: asyncio.Task = None
+        self.ready = False
+
+    def add(self, revocation_id: str, exp: float):
+        if exp <= datetime.now(timezone.utc).timestamp():
+            return
+        self._revoked[revocation_id] = exp
+        heapq.heappush(self._expiry_heap, (exp, revocation_id))
+
+    def is_revoked(self, revocation_id: str):
+        """
+        Returns True/False from the local replica, None when redis must be asked: while the replica is catching up,
+        and always for tokens without a jti, whose older revocations were bare token keys that never reach the set.
+        """
+        if not self.ready:
+            return None
+        exp = self._revoked.get(revocation_id)
+        revoked = exp is not None and exp > datetime.now(timezone.utc).timestamp()
+        if not revoked and revocation_id.startswith(LEGACY_REVOCATION_PREFIX):
+            return None
+        return revoked
+
+    def is_revoked_locally(self, revocation_id: str) -> bool:
+        """Answers from whatever the replica holds even while it is out of sync, used by degraded validation"""
+        exp = self._revoked.get(revocation_id)
+        return exp is not None and exp > datetime.now(timezone.utc).timestamp()
+
+    def purge_expired(self):
+        now = datetime.now(timezone.utc).timestamp()
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            exp, key = heapq.heappop(self._expiry_heap)
+            if self._revoked.get(key) == exp:
+                del self._revoked[key]
+
+    def __len__(self):
+        return len(self._revoked)
+
+    async def _hydrate(self, redis_client):
+        now = datetime.now(timezone.utc).timestamp()
+        await redis_client.zremrangebyscore(env_vars.REVOCATION_SET_KEY, "-inf", now)
+        entries = await redis_client.zrange(env_vars.REVOCATION_SET_KEY, 0, -1, withscores=True)
+        self._revoked.clear()
+        self._expiry_heap.clear()
+        for member, exp in entries:
+            self.add(member, exp)
+        logger.info("RevocationReplica:_hydrate():: Loaded %s revoked tokens", len(self._revoked))
+
+    async def _run(self, redis_client):
+        while True:
+            pubsub = redis_client.pubsub()
+            try:
+                # Subscribe before hydrating so nothing published in between is lost
+                await pubsub.subscribe(env_vars.REVOCATION_CHANNEL)
+                await self._hydrate(redis_client)
+                self.ready = True
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is not None:
+                        exp, revocation_id = message["data"].split(":", 1)
+                        self.add(revocation_id, float(exp))
+                    self.purge_expired()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.ready = False
+                logger.error("RevocationReplica:_run():: Replica disconnected, resyncing : e=%r", e, exc_info=True)
+                await asyncio.sleep(env_vars.REVOCATION_RESYNC_BACKOFF_SECONDS)
+            finally:
+                await pubsub.aclose()
+
+    def start(self, redis_client):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(redis_client))
+
+    async def stop(self):
+        self.ready = False
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def legacy_revocation_id(token: str) -> str:
+    return LEGACY_REVOCATION_PREFIX + hashlib.blake2b(token.encode(), digest_size=16).hexdigest()
+
+
+def get_revocation_id(token: str, decoded_token: dict) -> str:
+    # Tokens minted before jti was introduced are identified by a digest of the full token
+    return decoded_token.get("jti") or legacy_revocation_id(token)
+
+
+# Per-worker replica shared by every Controller instance
+revocation_replica = RevocationReplica()
+register_gauges(lambda: [
+    ("identity_revocation_replica_size", "Revoked token ids held locally", len(revocation_replica)),
+    ("identity_revocation_replica_ready", "1 when the local revocation replica is in sync", int(revocation_replica.ready))
+])
@@ -0,0 +1,125 @@
+from cryptography.hazmat.primitives import serialization
+from utils.metrics import stage
+import utils.config as env_vars
+
+import hashlib
+import json
+import jwt
+
+SYMMETRIC_ALGORITHMS = {"HS256", "HS384", "HS512"}
+
+
+def _load_pem_key(path: str):
+    # Retired keys may be shipped as public keys only, they are used for verification but never for signing
+    with open(path, "rb") as key_file:
+        pem = key_file.read()
+    try:
+        return serialization.load_pem_private_key(pem, password=None)
+    except ValueError:
+        return serialization.load_pem_public_key(pem)
+
+
+def _public_key(key):
+    return key.public_key() if hasattr(key, "public_key") else key
+
+
+def _key_id(key, algorithm: str) -> str:
+    if algorithm in SYMMETRIC_ALGORITHMS:
+        material = key.encode()
+    else:
+        material = _public_key(key).public_bytes(
+            serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+    return hashlib.sha256(material).hexdigest()[:16]
+
+
+class KeyRing:
+    """
+    Signing key plus every key still accepted for verification, indexed by kid. The first configured key signs,
+    the remaining ones stay verifiable until the tokens they signed have expired and they are removed from config.
+    """
+
+    def __init__(self, token_type: str, algorithm: str, key_paths: list, secret_key: str, legacy_secret_key: str = None):
+        self.token_type = token_type
+        self.algorithm = algorithm
+        self._verification_keys: dict = {}
+        self._signing_key = None
+        self._signing_kid = None
+
+        if algorithm in SYMMETRIC_ALGORITHMS:
+            keys = [secret_key]
+        else:
+            keys = [_load_pem_key(path) for path in key_paths]
+
+        for key in keys:
+            kid = _key_id(key, algorithm)
+            self._verification_keys[kid] = (key if algorithm in SYMMETRIC_ALGORITHMS else _public_key(key), algorithm)
+            if self._signing_key is None:
+                self._signing_key = key
+                self._signing_kid = kid
+
+        # Tokens minted before kid was introduced were HS signed with the shared secret and carry no kid header
+        if legacy_secret_key and env_vars.ALGORITHM in SYMMETRIC_ALGORITHMS:
+            self._verification_keys[None] = (legacy_secret_key, env_vars.ALGORITHM)
+
+    def encode(self, claims: dict) -> str:
+        with stage("jwt_encode"):
+            # typ keeps access and refresh tokens apart even when both rings share a key
+            return jwt.encode(
+                {**claims, "typ": self.token_type}, self._signing_key, algorithm=self.algorithm, headers={"kid": self._signing_kid}
+            )
+
+    def lookup(self, kid):
+        return self._verification_keys.get(kid)
+
+    def public_jwks(self) -> list:
+        if self.algorithm in SYMMETRIC_ALGORITHMS:
+            return []
+        jwks = []
+        for kid, (public_key, algorithm) in self._verification_keys.items():
+            if kid is None:
+                continue
+            jwk = json.loads(jwt.get_algorithm_by_name(algorithm).to_jwk(public_key))
+            jwk.update({"kid": kid, "alg": algorithm, "use": "sig"})
+            jwks.append(jwk)
+        return jwks
+
+
+def decode_token(token: str, *key_rings: KeyRing) -> dict:
+    """
+    Verifies a token against the key rings given, the kid header selects the key without trying each one.
+    The typ claim must match the ring that verified it, only tokens minted before kid and typ carry neither.
+    """
+    with stage("jwt_decode"):
+        kid = jwt.get_unverified_header(token).get("kid")
+        for key_ring in key_rings:
+            entry = key_ring.lookup(kid)
+            if entry is None:
+                continue
+            key, algorithm = entry
+            claims = jwt.decode(token, key, algorithms=[algorithm])
+            token_type = claims.get("typ")
+            if token_type == key_ring.token_type or (token_type is None and kid is None):
+                return claims
+    raise jwt.InvalidTokenError(f"No accepted key for this token type {kid=}")
+
+
+def _split_paths(paths: str) -> list:
+    return [path.strip() for path in (paths or "").split(",") if path.strip()]
+
+
+access_keys = KeyRing(
+    token_type = "access",
+    algorithm = env_vars.ACCESS_TOKEN_ALGORITHM,
+    key_paths = _split_paths(env_vars.ACCESS_SIGNING_KEYS),
+    secret_key = env_vars.SECRET_KEY,
+    legacy_secret_key = env_vars.SECRET_KEY
+)
+
+refresh_keys = KeyRing(
+    token_type = "refresh",
+    algorithm = env_vars.REFRESH_TOKEN_ALGORITHM,
+    key_paths = _split_paths(env_vars.REFRESH_SIGNING_KEYS),
+    secret_key = env_vars.REFRESH_SECRET_KEY or env_vars.SECRET_KEY,
+    legacy_secret_key = env_vars.SECRET_KEY
+)
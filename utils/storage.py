@@ -0,0 +1,367 @@
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from utils.logger import logger
+from utils.redis_client import init_redis_pool, close_redis_pool
+from utils.revocation_replica import revocation_replica, LEGACY_REVOCATION_PREFIX
+from utils.circuit_breaker import store_breaker
+import utils.config as env_vars
+
+import asyncio
+import heapq
+import math
+import re
+
+# Tokens revoked by older releases were stored under their own bare key, which no username may reach
+_JWT_SHAPE = re.compile(r"^eyJ[A-Za-z0-9_-]*\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]*$")
+
+# Creates the user hash unless the user exists, either namespaced or as a legacy bare key
+CREATE_USER_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return 0
+end
+return redis.call('HSETNX', KEYS[1], 'password', ARGV[1])
+"""
+
+# Writes the user hash and drops the legacy bare password key, if any, returns 1 when one was migrated
+SET_PASSWORD_SCRIPT = """
+redis.call('HSET', KEYS[1], 'password', ARGV[1])
+if redis.call('TYPE', KEYS[2])['ok'] == 'string' then
+    return redis.call('DEL', KEYS[2])
+end
+return 0
+"""
+
+
+class UserStore(ABC):
+    """Credentials and token generation per user"""
+
+    @abstractmethod
+    async def create_many(self, users: list) -> list:
+        """Atomically creates each absent (username, password_hash) pair, returns whether each one was created"""
+
+    @abstractmethod
+    async def exists_many(self, usernames: list) -> list:
+        pass
+
+    @abstractmethod
+    async def get_credentials(self, username: str):
+        """Returns (password_hash or None, generation)"""
+
+    @abstractmethod
+    async def set_password(self, username: str, password_hash: str):
+        pass
+
+    @abstractmethod
+    async def get_generations(self, usernames: list) -> list:
+        pass
+
+    @abstractmethod
+    async def bump_generation(self, username: str) -> int:
+        pass
+
+    async def create(self, username: str, password_hash: str) -> bool:
+        return (await self.create_many([(username, password_hash)]))[0]
+
+    async def get_generation(self, username: str) -> int:
+        return (await self.get_generations([username]))[0]
+
+    async def ping(self) -> bool:
+        return True
+
+
+class RevocationStore(ABC):
+    """Revoked token ids, each kept until the exp of the token it revokes"""
+
+    @abstractmethod
+    async def revoke_many(self, revocations: list):
+        """Records (revocation_id, exp) pairs"""
+
+    @abstractmethod
+    async def are_revoked(self, lookups: list) -> list:
+        """Takes (revocation_id, token) pairs, the token is only consulted for legacy ids"""
+
+    async def revoke(self, revocation_id: str, exp: float):
+        await self.revoke_many([(revocation_id, exp)])
+
+    async def is_revoked(self, revocation_id: str, token: str) -> bool:
+        return (await self.are_revoked([(revocation_id, token)]))[0]
+
+
+def user_key(username: str) -> str:
+    return f"{env_vars.USER_KEY_PREFIX}{username}"
+
+
+def revocation_key(revocation_id: str) -> str:
+    return f"{env_vars.REVOCATION_KEY_PREFIX}{revocation_id}"
+
+
+def legacy_key_allowed(username: str) -> bool:
+    """Whether the bare <username> key may hold a legacy user, rather than one of the keys the app itself writes"""
+    if not env_vars.STORAGE_LEGACY_FALLBACK:
+        return False
+    prefixes = (env_vars.USER_KEY_PREFIX, env_vars.REVOCATION_KEY_PREFIX, env_vars.RATE_LIMIT_KEY_PREFIX)
+    if username.startswith(prefixes) or username in (env_vars.REVOCATION_SET_KEY, env_vars.REVOCATION_CHANNEL):
+        return False
+    return _JWT_SHAPE.match(username) is None
+
+
+class RedisUserStore(UserStore):
+    """
+    Users live in user:<username> hashes holding password and generation. With STORAGE_LEGACY_FALLBACK the
+    bare <username> password keys written by older releases are read, and migrated once a login proves the password.
+    """
+
+    def __init__(self, redis_client):
+        self._redis = redis_client
+        self._create_user = redis_client.register_script(CREATE_USER_SCRIPT)
+        self._set_password = redis_client.register_script(SET_PASSWORD_SCRIPT)
+
+    async def create_many(self, users: list) -> list:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for username, password_hash in users:
+                if legacy_key_allowed(username):
+                    await self._create_user(keys=[user_key(username), username], args=[password_hash], client=pipe)
+                else:
+                    pipe.hsetnx(user_key(username), "password", password_hash)
+            return [bool(created) for created in await pipe.execute()]
+
+    async def exists_many(self, usernames: list) -> list:
+        legacy = [legacy_key_allowed(username) for username in usernames]
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for username, check_legacy in zip(usernames, legacy):
+                pipe.hexists(user_key(username), "password")
+                if check_legacy:
+                    pipe.exists(username)
+            replies = iter(await pipe.execute())
+        exists = []
+        for check_legacy in legacy:
+            found = bool(next(replies))
+            if check_legacy:
+                found = bool(next(replies)) or found
+            exists.append(found)
+        return exists
+
+    async def get_credentials(self, username: str):
+        if not legacy_key_allowed(username):
+            password_hash, generation = await self._redis.hmget(user_key(username), "password", "generation")
+            return password_hash, int(generation or 0)
+
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hmget(user_key(username), "password", "generation")
+            pipe.get(username)
+            credentials, legacy_password = await pipe.execute(raise_on_error=False)
+        if isinstance(credentials, Exception):
+            raise credentials
+        password_hash, generation = credentials
+        # A username naming a key that is not a string is answered WRONGTYPE and is not a legacy user
+        if isinstance(legacy_password, Exception):
+            legacy_password = None
+        if password_hash is None:
+            # Nothing is written here, set_password migrates the key once the caller has verified the password
+            password_hash = legacy_password
+        return password_hash, int(generation or 0)
+
+    async def set_password(self, username: str, password_hash: str):
+        if not legacy_key_allowed(username):
+            await self._redis.hset(user_key(username), "password", password_hash)
+            return
+        if await self._set_password(keys=[user_key(username), username], args=[password_hash]):
+            logger.info("RedisUserStore:set_password():: Migrated legacy user key for %s", username)
+
+    async def ping(self) -> bool:
+        return bool(await self._redis.ping())
+
+    async def get_generations(self, usernames: list) -> list:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for username in usernames:
+                pipe.hget(user_key(username), "generation")
+            return [int(reply or 0) for reply in await pipe.execute()]
+
+    async def bump_generation(self, username: str) -> int:
+        return int(await self._redis.hincrby(user_key(username), "generation", 1))
+
+
+class RedisRevocationStore(RevocationStore):
+    """revoked:<id> keys expiring at exp, mirrored into a sorted set and pub/sub channel for the worker replicas"""
+
+    def __init__(self, redis_client):
+        self._redis = redis_client
+
+    async def revoke_many(self, revocations: list):
+        now = datetime.now(timezone.utc).timestamp()
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for revocation_id, exp in revocations:
+                # SETEX rejects a ttl of 0, a token about to expire is still revoked for its last second
+                pipe.setex(revocation_key(revocation_id), max(math.ceil(exp - now), 1), 1)
+                pipe.zadd(env_vars.REVOCATION_SET_KEY, {revocation_id: exp})
+                pipe.publish(env_vars.REVOCATION_CHANNEL, f"{exp}:{revocation_id}")
+            pipe.zremrangebyscore(env_vars.REVOCATION_SET_KEY, "-inf", now)
+            await pipe.execute()
+        for revocation_id, exp in revocations:
+            revocation_replica.add(revocation_id, exp)
+
+    async def are_revoked(self, lookups: list) -> list:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for revocation_id, token in lookups:
+                keys = [revocation_key(revocation_id)]
+                if revocation_id.startswith(LEGACY_REVOCATION_PREFIX):
+                    # Revocations written before jti was introduced are keyed on the bare token
+                    keys.append(token)
+                pipe.exists(*keys)
+            return [bool(reply) for reply in await pipe.execute()]
+
+
+class MemoryUserStore(UserStore):
+    """In-process users for single node deployments and tests, lost on restart"""
+
+    def __init__(self):
+        self._users: dict = {}
+
+    async def create_many(self, users: list) -> list:
+        created = []
+        for username, password_hash in users:
+            if username in self._users:
+                created.append(False)
+                continue
+            self._users[username] = {"password": password_hash, "generation": 0}
+            created.append(True)
+        return created
+
+    async def exists_many(self, usernames: list) -> list:
+        return [username in self._users for username in usernames]
+
+    async def get_credentials(self, username: str):
+        user = self._users.get(username)
+        if user is None:
+            return None, 0
+        return user["password"], user["generation"]
+
+    async def set_password(self, username: str, password_hash: str):
+        self._users.setdefault(username, {"password": None, "generation": 0})["password"] = password_hash
+
+    async def get_generations(self, usernames: list) -> list:
+        return [self._users.get(username, {}).get("generation", 0) for username in usernames]
+
+    async def bump_generation(self, username: str) -> int:
+        user = self._users.setdefault(username, {"password": None, "generation": 0})
+        user["generation"] += 1
+        return user["generation"]
+
+
+class MemoryRevocationStore(RevocationStore):
+    """In-process revocations, evicted once the revoked token's exp passes"""
+
+    def __init__(self):
+        self._revoked: dict = {}
+        self._expiry_heap: list = []
+
+    def _purge_expired(self, now: float):
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            exp, revocation_id = heapq.heappop(self._expiry_heap)
+            if self._revoked.get(revocation_id) == exp:
+                del self._revoked[revocation_id]
+
+    async def revoke_many(self, revocations: list):
+        now = datetime.now(timezone.utc).timestamp()
+        self._purge_expired(now)
+        for revocation_id, exp in revocations:
+            if exp > now:
+                self._revoked[revocation_id] = exp
+                heapq.heappush(self._expiry_heap, (exp, revocation_id))
+
+    async def are_revoked(self, lookups: list) -> list:
+        now = datetime.now(timezone.utc).timestamp()
+        self._purge_expired(now)
+        return [self._revoked.get(revocation_id, 0) > now for revocation_id, _ in lookups]
+
+
+def _parse_timeouts(timeouts: str) -> dict:
+    parsed = {}
+    for pair in timeouts.split(","):
+        if ":" in pair:
+            name, seconds = pair.split(":", 1)
+            parsed[name.strip()] = float(seconds)
+    return parsed
+
+
+class GuardedStore:
+    """
+    Wraps every coroutine method of a store in a per-operation deadline and the shared circuit breaker,
+    so a slow or dead redis raises StoreUnavailable quickly instead of piling up connections.
+    """
+
+    def __init__(self, store, breaker, timeouts: dict):
+        self._store = store
+        self._breaker = breaker
+        self._timeouts = timeouts
+        self._guarded: dict = {}
+
+    def __getattr__(self, name):
+        guarded = self._guarded.get(name)
+        if guarded is not None:
+            return guarded
+
+        method = getattr(self._store, name)
+        if not asyncio.iscoroutinefunction(method):
+            return method
+        timeout = self._timeouts.get(name, env_vars.STORE_TIMEOUT_SECONDS)
+
+        async def guarded(*args, **kwargs):
+            return await self._breaker.call(lambda: method(*args, **kwargs), timeout)
+
+        self._guarded[name] = guarded
+        return guarded
+
+
+user_store: UserStore = None
+revocation_store: RevocationStore = None
+
+
+async def init_storage():
+    global user_store, revocation_store
+    if env_vars.STORAGE_BACKEND == "memory":
+        user_store = MemoryUserStore()
+        revocation_store = MemoryRevocationStore()
+    elif env_vars.STORAGE_BACKEND == "redis":
+        redis_client = await init_redis_pool()
+        timeouts = _parse_timeouts(env_vars.STORE_TIMEOUTS)
+        user_store = GuardedStore(RedisUserStore(redis_client), store_breaker, timeouts)
+        revocation_store = GuardedStore(RedisRevocationStore(redis_client), store_breaker, timeouts)
+        revocation_replica.start(redis_client)
+        # Opens the first pooled connection so the worker is warm, readiness keeps reporting until redis is up
+        if not await storage_ready():
+            logger.warning("init_storage():: Redis is not reachable yet, readiness will report it")
+    else:
+        raise ValueError(f"Unknown STORAGE_BACKEND {env_vars.STORAGE_BACKEND!r}, expected redis or memory")
+    logger.info("init_storage():: Storage backend %s ready", env_vars.STORAGE_BACKEND)
+
+
+async def close_storage():
+    global user_store, revocation_store
+    if env_vars.STORAGE_BACKEND == "redis":
+        await revocation_replica.stop()
+        await close_redis_pool()
+    user_store = None
+    revocation_store = None
+
+
+async def storage_ready() -> bool:
+    if user_store is None:
+        return False
+    try:
+        return await asyncio.wait_for(user_store.ping(), timeout=env_vars.READINESS_TIMEOUT_SECONDS)
+    except Exception as e:
+        logger.warning("storage_ready():: Storage ping failed : e=%r", e)
+        return False
+
+
+def get_user_store() -> UserStore:
+    if user_store is None:
+        raise RuntimeError("Storage is not initialized")
+    return user_store
+
+
+def get_revocation_store() -> RevocationStore:
+    if revocation_store is None:
+        raise RuntimeError("Storage is not initialized")
+    return revocation_store
@@ -0,0 +1,89 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+import hashlib
+import utils.config as env_vars
+
+from utils.metrics import register_gauges
+
+
+class TokenCache:
+    """
+    Bounded LRU + TTL cache of token verification results, keyed by a digest of the token.
+    Entries never outlive the token's own exp claim.
+    """
+
+    def __init__(self, capacity: int, ttl_seconds: float):
+        self._capacity = capacity
+        self._ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self, token: str):
+        """Returns (claims, revocation_id, revoked) for a cached token, None on a miss"""
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, claims, revocation_id, revoked = entry
+        if expires_at <= datetime.now(timezone.utc).timestamp():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims, revocation_id, revoked
+
+    def put(self, token: str, claims: dict, revocation_id: str = None, revoked: bool = False):
+        if self._capacity <= 0:
+            return
+        now = datetime.now(timezone.utc).timestamp()
+        expires_at = min(now + self._ttl_seconds, claims.get("exp"))
+        if expires_at <= now:
+            return
+
+        key = self._key(token)
+        self._entries[key] = (expires_at, claims, revocation_id, revoked)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, token: str):
+        self._entries.pop(self._key(token), None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "capacity": self._capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+
+# Per-worker cache shared by every Controller instance
+token_cache = TokenCache(
+    capacity = env_vars.TOKEN_CACHE_CAPACITY,
+    ttl_seconds = env_vars.TOKEN_CACHE_TTL_SECONDS
+)
+register_gauges(lambda: [
+    ("identity_token_cache_size", "Verified token cache entries", len(token_cache._entries)),
+    ("identity_token_cache_hits_total", "Verified token cache hits", token_cache.hits),
+    ("identity_token_cache_misses_total", "Verified token cache misses", token_cache.misses),
+    ("identity_token_cache_evictions_total", "Verified token cache LRU evictions", token_cache.evictions),
+    ("identity_token_cache_hit_ratio", "Verified token cache hit ratio", token_cache.stats()["hit_ratio"])
+])
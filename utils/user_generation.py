@@ -0,0 +1,56 @@
+from datetime import datetime, timezone
+import utils.config as env_vars
+
+
+class GenerationTable:
+    """
+    Worker-local cache of per-user token generations. Every token carries the generation it was minted
+    with, bumping the generation in the user store invalidates all of a user's tokens at once.
+    """
+
+    def __init__(self, ttl_seconds: float, capacity: int):
+        self._ttl_seconds = ttl_seconds
+        self._capacity = capacity
+        self._generations: dict = {}
+
+    def _store(self, username: str, generation: int):
+        if len(self._generations) >= self._capacity and username not in self._generations:
+            # Entries are cheap to refetch, so a full table is simply dropped
+            self._generations.clear()
+        self._generations[username] = (generation, datetime.now(timezone.utc).timestamp() + self._ttl_seconds)
+
+    def peek(self, username: str):
+        """Returns the locally cached generation, None when it is missing or stale"""
+        entry = self._generations.get(username)
+        if entry is not None and entry[1] > datetime.now(timezone.utc).timestamp():
+            return entry[0]
+        return None
+
+    def peek_stale(self, username: str) -> int:
+        """Returns the last known generation regardless of age, 0 when the user was never seen"""
+        entry = self._generations.get(username)
+        return entry[0] if entry is not None else 0
+
+    async def get(self, user_store, username: str) -> int:
+        generation = self.peek(username)
+        if generation is not None:
+            return generation
+        generation = await user_store.get_generation(username)
+        self._store(username, generation)
+        return generation
+
+    def update(self, username: str, generation) -> int:
+        generation = int(generation or 0)
+        self._store(username, generation)
+        return generation
+
+    async def bump(self, user_store, username: str) -> int:
+        generation = await user_store.bump_generation(username)
+        return self.update(username, generation)
+
+
+# Per-worker generation table shared by every Controller instance
+generation_table = GenerationTable(
+    ttl_seconds = env_vars.GENERATION_CACHE_TTL_SECONDS,
+    capacity = env_vars.GENERATION_CACHE_CAPACITY
+)